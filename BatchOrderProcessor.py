@@ -0,0 +1,144 @@
+import csv
+import json
+import sys
+import time
+from Order import Order
+from Records import NewCustomer, Records
+from pages.PlaceOrderPage import PlaceOrderPage
+
+MEMBERSHIP_TYPES = ('C', 'M', 'V')
+
+
+class BatchOrderProcessor():
+    """
+    Places the orders of an order feed without prompting. Every order is validated the
+    same way PlaceOrderPage validates interactive input, and unknown customers are signed
+    up with the membership type given in the feed (a plain customer if none is given),
+    once their order is placed. Valid orders are executed through Records.execute_orders
+    in batches of `batch_size`.
+
+    A feed is either a CSV file with a header row, or a file of JSON objects, one per
+    line (.jsonl/.json). The fields are customer (name or id), product (name or id),
+    quantity and, optionally, membership (C, M or V).
+
+    Args:
+        records (Records): The records to place the orders in
+        batch_size (int, optional): The number of orders executed at a time
+        errors (file, optional): Where rejected orders are reported
+
+    Attributes:
+        accepted (int): The number of orders placed
+        rejected (int): The number of orders rejected
+        elapsed (float): The time spent processing feeds, in seconds
+    """
+
+    def __init__(self, records: Records, batch_size: int = 1000, errors=sys.stderr) -> None:
+        self.records = records
+        self.batch_size = batch_size
+        self.errors = errors
+        self._validator = PlaceOrderPage(records)
+        self.accepted = 0
+        self.rejected = 0
+        self.elapsed = 0.
+
+    def process_file(self, file_path: str):
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            if file_path.endswith(('.jsonl', '.json')):
+                rows = self._json_rows(f)
+            else:
+                rows = csv.DictReader(f, skipinitialspace=True)
+            self.process(rows)
+
+    @staticmethod
+    def _json_rows(f):
+        # A line which is not JSON is passed on as its error, so only that order is rejected
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield e
+
+    def process(self, rows):
+        start = time.perf_counter()
+        pending = []
+        sign_ups = {}
+        for line_number, row in enumerate(rows, 1):
+            if isinstance(row, ValueError):
+                self._reject(line_number, f'Malformed order: {row}')
+                continue
+            order, reason = self.create_order(row, sign_ups)
+            if order is None:
+                self._reject(line_number, reason)
+                continue
+            pending.append((line_number, order))
+            if len(pending) >= self.batch_size:
+                self._execute(pending)
+                pending = []
+                # Customers signed up by the batch are found by name from now on
+                sign_ups = {}
+        if pending:
+            self._execute(pending)
+        self.elapsed += time.perf_counter() - start
+
+    def report(self):
+        total = self.accepted + self.rejected
+        rate = total / self.elapsed if self.elapsed > 0 else 0.
+        return (f'Processed {total} orders in {self.elapsed:.3f}s ({rate:.0f} orders/s): '
+                f'{self.accepted} placed, {self.rejected} rejected')
+
+    def create_order(self, row, sign_ups=None):
+        """
+        Creates the order described by a feed row. The customer of an order by a new
+        customer is a NewCustomer, signed up once the order is executed.
+
+        Args:
+            row (dict): The customer, product, quantity and optional membership
+            sign_ups (dict of str: NewCustomer, optional): The new customers of the
+                orders created so far but not executed yet, by name
+        Returns:
+            tuple of (Order|None, str|None): The order, or None and why it is invalid
+        """
+        try:
+            customer_query = str(row['customer']).strip()
+            product_query = str(row['product']).strip()
+            quantity = str(row['quantity']).strip()
+            membership = str(row.get('membership') or 'C').strip().upper()
+        except (KeyError, AttributeError, TypeError):
+            return None, f'Malformed order {row!r}'
+
+        product = self.records.find_product(product_query, search_in_name=True)
+        if product is None:
+            product = self.records.find_product(product_query)
+        if product is None:
+            return None, f'Product {product_query!r} could not be found'
+        reason = self._validator.invalid_product_reason(product)
+        if reason is not None:
+            return None, reason
+        if not self._validator.validate_quantity(quantity):
+            return None, f'{quantity} is an invalid amount'
+        if int(quantity) > product.stock:
+            return None, f'{quantity} exceeds the {product.stock} {product.name}(s) in stock'
+        if membership not in MEMBERSHIP_TYPES:
+            return None, f'{membership} is not a membership type'
+
+        customer = self.records.find_customer(customer_query)
+        if customer is None:
+            if sign_ups is None:
+                sign_ups = {}
+            customer = sign_ups.get(customer_query)
+            if customer is None:
+                customer = sign_ups[customer_query] = NewCustomer(customer_query, membership)
+        return Order(customer, product, int(quantity)), None
+
+    def _execute(self, pending):
+        results = self.records.execute_orders([order for _, order in pending])
+        for (line_number, _), (executed, reason) in zip(pending, results):
+            if executed:
+                self.accepted += 1
+            else:
+                self._reject(line_number, reason)
+
+    def _reject(self, line_number: int, reason: str):
+        self.rejected += 1
+        print(f'Order {line_number} rejected: {reason}', file=self.errors)
@@ -1,10 +1,30 @@
+import sys
+from Money import apply_discount
+
+_UNPRICED = object()
+
+
 class Bundle():
+    __slots__ = ('_id', '_name', '_products', 'stock', '_discount', '_price')
+
     def __init__(self, id: str, name: str, products, stock: int, discount: float = 0.2) -> None:
-        self._id = id
-        self._name = name
-        self.products = products
+        self._id = sys.intern(id)
+        self._name = sys.intern(name)
+        self._products = tuple(products)
         self.stock = stock
-        self.discount = discount
+        self._discount = discount
+        self._price = _UNPRICED
+        for product in {product.id: product for product in self._products}.values():
+            product.add_bundle(self)
+
+    def __getstate__(self):
+        # The cached price is left out, since the sentinel marking it as not cached
+        # would not be the same object once unpickled
+        return self._id, self._name, self._products, self.stock, self._discount
+
+    def __setstate__(self, state):
+        self._id, self._name, self._products, self.stock, self._discount = state
+        self._price = _UNPRICED
 
     def __iter__(self):
         i = [self.id, self.name, self.products, self.stock]
@@ -18,11 +38,27 @@ class Bundle():
     def name(self):
         return self._name
     @property
+    def products(self):
+        return self._products
+    @property
+    def discount(self):
+        return self._discount
+    @discount.setter
+    def discount(self, discount):
+        self._discount = discount
+        self.invalidate_price()
+    @property
     def price(self):
-        prices = list(map(lambda x: x['price'], self.products))
-        if None in prices:
-            return None
-        return sum(prices) * (1-self.discount)
+        if self._price is _UNPRICED:
+            prices = [product.price for product in self._products]
+            if None in prices:
+                self._price = None
+            else:
+                self._price = apply_discount(sum(prices), self.discount)
+        return self._price
+
+    def invalidate_price(self):
+        self._price = _UNPRICED
     
     def __eq__(self, __o: object) -> bool:
-        return self._id == __o.id
\ No newline at end of file
+        return self._id == __o.id
@@ -0,0 +1,158 @@
+from Customer import Customer
+from Member import Member
+from VIPMember import VIPMember
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CUSTOMER_TYPES = 'CMV'
+
+
+class ColumnarCustomerStore():
+    """
+    A list-like container of customers, which keeps the customer type, discount rate
+    and value of every customer in contiguous NumPy arrays. The customers it holds are
+    views over their row, so changing a customer's value or discount rate changes the
+    arrays, and the arrays can be used for vectorised reporting across all customers.
+
+    Requires numpy.
+
+    Args:
+        customers (iterable of Customer, optional): The customers to store
+        capacity (int, optional): The number of rows to allocate up front
+
+    Attributes:
+        type_codes (ndarray of uint8): Index of each customer's type in CUSTOMER_TYPES
+        discount_rates (ndarray of float64): The current discount rate of each customer
+        values (ndarray of int64): The value of each customer, in 1/Money.SCALE dollars
+    """
+
+    def __init__(self, customers=(), capacity: int = 1024) -> None:
+        if np is None:
+            raise ImportError('The columnar customer store requires numpy')
+        self._size = 0
+        self._type_code = np.zeros(capacity, dtype=np.uint8)
+        self._discount_rate = np.zeros(capacity, dtype=np.float64)
+        self._value = np.zeros(capacity, dtype=np.int64)
+        self._customers = []
+        self._rows = {}
+        for customer in customers:
+            self.append(customer)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        return iter(self._customers)
+
+    def __getitem__(self, index):
+        return self._customers[index]
+
+    def append(self, customer: Customer):
+        if self._size == len(self._value):
+            self._grow()
+        row = self._size
+        self._type_code[row] = CUSTOMER_TYPES.index(customer.id[0])
+        self._discount_rate[row] = customer.discount_rate
+        self._value[row] = customer.value
+
+        view = object.__new__(_view_class(type(customer)))
+        view._id = customer.id
+        view._name = customer.name
+        view._store = self
+        view._row = row
+        self._customers.append(view)
+        self._rows[customer.id] = row
+        self._size += 1
+
+    def row_of(self, id: str):
+        return self._rows.get(id)
+
+    @property
+    def type_codes(self):
+        return self._type_code[:self._size]
+
+    @property
+    def discount_rates(self):
+        # Customers and members share a class-wide rate, which may have changed since
+        # their row was written.
+        rates = self._discount_rate[:self._size].copy()
+        codes = self.type_codes
+        rates[codes == CUSTOMER_TYPES.index('C')] = Customer._discount_rate
+        rates[codes == CUSTOMER_TYPES.index('M')] = Member._discount_rate
+        return rates
+
+    @property
+    def values(self):
+        return self._value[:self._size]
+
+    def total_value_by_type(self):
+        # Summed as int64 rather than with bincount, whose float weights would round
+        totals = np.zeros(len(CUSTOMER_TYPES), dtype=np.int64)
+        np.add.at(totals, self.type_codes, self.values)
+        return dict(zip(CUSTOMER_TYPES, totals.tolist()))
+
+    def count_by_type(self):
+        counts = np.bincount(self.type_codes, minlength=len(CUSTOMER_TYPES))
+        return dict(zip(CUSTOMER_TYPES, counts.tolist()))
+
+    def customers_above(self, threshold: int = None):
+        if threshold is None:
+            threshold = VIPMember._discount_threshold
+        rows = np.flatnonzero(self.values > threshold)
+        return [self._customers[row] for row in rows.tolist()]
+
+    def _grow(self):
+        capacity = max(1, 2 * len(self._value))
+        for name in ('_type_code', '_discount_rate', '_value'):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+
+_view_classes = {}
+
+def _view_class(customer_class):
+    view_class = _view_classes.get(customer_class)
+    if view_class is not None:
+        return view_class
+
+    def get_value(self):
+        return int(self._store._value[self._row])
+
+    def set_value(self, value):
+        self._store._value[self._row] = value
+
+    def attributes(self):
+        attributes = customer_class._attributes(self)
+        del attributes['_store'], attributes['_row']
+        return attributes
+
+    def reduce(self):
+        # A view pickles as the plain customer it shows
+        args = (self.id, self.name, self.value)
+        if issubclass(customer_class, VIPMember):
+            args += (self.discount_rate,)
+        return customer_class, args
+
+    namespace = {
+        '__slots__': ('_store', '_row'),
+        'value': property(get_value, set_value),
+        '_attributes': attributes,
+        '__reduce__': reduce,
+    }
+    if issubclass(customer_class, VIPMember):
+        def get_discount_rate(self):
+            return float(self._store._discount_rate[self._row])
+
+        def set_discount_rate(self, rate):
+            self._store._discount_rate[self._row] = rate
+
+        namespace['_discount_rate'] = property(get_discount_rate, set_discount_rate)
+
+    view_class = type(customer_class.__name__, (customer_class,), namespace)
+    _view_classes[customer_class] = view_class
+    return view_class
@@ -1,9 +1,14 @@
+import sys
+
+
 class Customer():
+    __slots__ = ('_id', '_name', 'value')
     _discount_rate = 0.
 
-    def __init__(self, id: str, name: str, value: float = 0) -> None:
-        self._id = id
-        self._name = name
+    def __init__(self, id: str, name: str, value: int = 0) -> None:
+        self._id = sys.intern(id)
+        self._name = sys.intern(name)
+        # In 1/Money.SCALE dollars, like every amount of money
         self.value = value
 
     def __iter__(self):
@@ -27,10 +32,14 @@ class Customer():
         return self.discount_rate, price
 
     def display_info(self):
-        attr = vars(self)
+        attr = self._attributes()
         attr['discount_rate'] = self.discount_rate
         print(f'Customer: {attr}')
 
+    def _attributes(self):
+        slots = [getattr(cls, '__slots__', ()) for cls in reversed(type(self).__mro__)]
+        return {name: getattr(self, name) for names in slots for name in names}
+
 
     def __eq__(self, __o: object) -> bool:
-            return self._id == __o.id
\ No newline at end of file
+            return self._id == __o.id
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from Customer import Customer
+from PersistentStorageManager import PersistentStorageManager
+
+
+class JournalStorageManager(PersistentStorageManager):
+    """
+    A PersistentStorageManager which appends every customer/product change to a journal
+    instead of rewriting the CSV files.
+
+    The customer and product files act as snapshots. At startup the journal is replayed
+    on top of them, so the records read are the same as if every change had been written
+    to the CSV files directly. When the journal grows past `compact_threshold` bytes it
+    is rotated to a `.compacting` file and folded into fresh snapshots by a background
+    thread, while new changes keep being appended to a new journal. Should the program
+    stop during compaction, the `.compacting` file is folded again on the next start.
+
+    Args:
+        customer_file_path (str): The file path to the customer snapshot file
+        product_file_path (str): The file path to the product snapshot file
+        orders_file_path (str, optional): The file path to the orders storage file
+        journal_file_path (str, optional): The file path to the journal. Defaults to
+            journal.log next to the customer file
+        compact_threshold (int, optional): Journal size in bytes which triggers compaction
+    """
+
+    def __init__(self, customer_file_path: str, product_file_path: str, orders_file_path: str = None,
+                 journal_file_path: str = None, compact_threshold: int = 1 << 20) -> None:
+        super().__init__(customer_file_path, product_file_path, orders_file_path)
+        if journal_file_path is None:
+            journal_file_path = os.path.join(os.path.dirname(customer_file_path), 'journal.log')
+        self.journal_file_path = journal_file_path
+        self.compacting_file_path = journal_file_path + '.compacting'
+        self.compact_threshold = compact_threshold
+        self._files = {'customers': customer_file_path, 'products': product_file_path}
+        self._file_keys = {file_path: file for file, file_path in self._files.items()}
+        self._lock = threading.Lock()
+        self._compactor = None
+
+        if os.path.exists(self.compacting_file_path):
+            self._fold(self._read_journal(self.compacting_file_path))
+            os.remove(self.compacting_file_path)
+        self._pending = self._read_journal(self.journal_file_path)
+        self._journal_size = os.path.getsize(self.journal_file_path) if os.path.exists(self.journal_file_path) else 0
+
+    def csv_reader(self, file_path):
+        pending = dict(self._pending.get(file_path, {}))
+        for args in super().csv_reader(file_path):
+            line = pending.pop(args[0], None)
+            yield args if line is None else line.split(', ')
+        for line in pending.values():
+            yield line.split(', ')
+
+    def source_paths(self):
+        return super().source_paths() + [self.journal_file_path]
+
+    def save_customer(self, customer: Customer):
+        try:
+            self._rewrite_records(self.customer_file_path, {customer.id: self.format_customer(customer)})
+        except IOError as e:
+            print('Error saving customer to file. Exitting...')
+            raise e
+
+    def _rewrite_records(self, file_path: str, lines):
+        file = self._file_keys[file_path]
+        entries = [json.dumps({'file': file, 'id': id, 'line': line}) + '\n' for id, line in lines.items()]
+        entries = ''.join(entries)
+        with self._lock:
+            with open(self.journal_file_path, 'a', encoding='utf-8') as f:
+                f.write(entries)
+            self._pending.setdefault(file_path, {}).update(lines)
+            self._journal_size += len(entries.encode('utf-8'))
+            if self._journal_size < self.compact_threshold or self._compactor is not None:
+                return
+            folded = self._rotate()
+            self._compactor = threading.Thread(target=self._compact, args=(folded,), daemon=True)
+            self._compactor.start()
+
+    def compact(self):
+        """
+        Folds the journal into the snapshot files, waiting for a running
+        background compaction to finish first.
+        """
+        self.close()
+        with self._lock:
+            folded = self._rotate()
+        self._compact(folded)
+
+    def close(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        super().close()
+
+    def _rotate(self):
+        if os.path.exists(self.journal_file_path):
+            os.replace(self.journal_file_path, self.compacting_file_path)
+        self._journal_size = 0
+        return {file_path: dict(rows) for file_path, rows in self._pending.items()}
+
+    def _compact(self, folded):
+        self._fold(folded)
+        with self._lock:
+            if os.path.exists(self.compacting_file_path):
+                os.remove(self.compacting_file_path)
+            for file_path, rows in folded.items():
+                pending = self._pending.get(file_path, {})
+                for id, line in rows.items():
+                    if pending.get(id) is line:
+                        del pending[id]
+            self._compactor = None
+
+    def _fold(self, folded):
+        for file_path, rows in folded.items():
+            if not rows:
+                continue
+            rows = dict(rows)
+            with open(file_path, 'r', encoding='utf-8') as f:
+                with self._replacing(file_path) as f_new:
+                    for line in f:
+                        new_line = rows.pop(line.split(', ', 1)[0], None)
+                        f_new.write(line if new_line is None else new_line + '\n')
+                    for line in rows.values():
+                        f_new.write(line + '\n')
+
+    def _read_journal(self, journal_file_path: str):
+        pending = {}
+        if not os.path.exists(journal_file_path):
+            return pending
+        with open(journal_file_path, 'r', encoding='utf-8') as f:
+            for entry in f:
+                try:
+                    entry = json.loads(entry)
+                except ValueError:
+                    # A torn final write from a crash; everything before it is intact
+                    break
+                pending.setdefault(self._files[entry['file']], {})[entry['id']] = entry['line']
+        return pending
@@ -0,0 +1,105 @@
+import csv
+import heapq
+import itertools
+import json
+import sys
+from types import SimpleNamespace
+
+FORMATS = ('text', 'csv', 'jsonl')
+
+
+class Listing():
+    """
+    Which rows of a listing of customers, products or orders are shown, and how.
+
+    Rows can be filtered on the type letter their first column starts with (C, M or V
+    for customers and orders, P or B for products), sorted on a column and cut to a
+    page with offset and limit. They are rendered as text, CSV or JSON lines and
+    written to the output in chunks of `buffer_rows` rows rather than one write per
+    row. Rows are streamed from the records, so unless they are sorted the listing is
+    never held in memory. Sorting with a limit only keeps offset + limit rows.
+
+    Args:
+        format (str, optional): One of text, csv or jsonl
+        output (file, optional): Where the listing is written. Defaults to sys.stdout
+        offset (int, optional): The number of rows to skip
+        limit (int, optional): The most rows to show
+        sort_by (str, optional): The column to sort on
+        descending (bool, optional): Whether to sort from high to low
+        types (str, optional): The type letters of the rows to show, e.g. 'MV'
+        buffer_rows (int, optional): The number of rows written at a time
+    """
+
+    def __init__(self, format: str = 'text', output=None, offset: int = 0, limit: int = None, sort_by: str = None,
+                 descending: bool = False, types: str = None, buffer_rows: int = 1024) -> None:
+        if format not in FORMATS:
+            raise ValueError(f'{format} is not one of {", ".join(FORMATS)}')
+        self.format = format
+        self.output = output
+        self.offset = offset
+        self.limit = limit
+        self.sort_by = sort_by
+        self.descending = descending
+        self.types = types
+        self.buffer_rows = buffer_rows
+
+    def select(self, columns, rows):
+        if self.types:
+            rows = (row for row in rows if row[0][:1] in self.types)
+        if self.sort_by is not None:
+            if self.sort_by not in columns:
+                raise ValueError(f'Cannot sort on {self.sort_by}, the columns are {", ".join(columns)}')
+            index = columns.index(self.sort_by)
+            # Rows without a value, such as unpriced products, sort after the others
+            key = lambda row: (row[index] is None, row[index])
+            if self.limit is None:
+                rows = sorted(rows, key=key, reverse=self.descending)
+            elif self.descending:
+                rows = heapq.nlargest(self.offset + self.limit, rows, key=key)
+            else:
+                rows = heapq.nsmallest(self.offset + self.limit, rows, key=key)
+        stop = None if self.limit is None else self.offset + self.limit
+        return itertools.islice(rows, self.offset, stop)
+
+    def render(self, title: str, columns, rows, text=None, values=None):
+        """
+        Writes the selected rows. In text format the title comes first, above the
+        first page only, and every row is formatted by text (comma separated by default).
+        In csv and jsonl format the values written can be converted from the row by values.
+
+        Args:
+            title (str): The title of a text listing
+            columns (tuple of str): The names of the columns of the rows
+            rows (iterable of tuple): The rows, in the order of the columns
+            text (callable, optional): Formats a row in text format
+            values (callable, optional): Converts a row in csv and jsonl format
+        Returns:
+            int: The number of rows written
+        """
+        output = self.output or sys.stdout
+        chunk = []
+        if self.format == 'text':
+            if title and self.offset == 0:
+                chunk.append(title + '\n')
+            text = text or (lambda row: ', '.join(map(str, row)))
+            render_row = lambda row: chunk.append(text(row) + '\n')
+        elif self.format == 'csv':
+            writer = csv.writer(SimpleNamespace(write=chunk.append), lineterminator='\n')
+            writer.writerow(columns)
+            render_row = lambda row: writer.writerow([' '.join(v) if isinstance(v, tuple) else v for v in row])
+        else:
+            render_row = lambda row: chunk.append(json.dumps(dict(zip(columns, row))) + '\n')
+        if self.format != 'text' and values is not None:
+            render_values = render_row
+            render_row = lambda row: render_values(values(row))
+
+        count = 0
+        for row in self.select(columns, rows):
+            render_row(row)
+            count += 1
+            if len(chunk) >= self.buffer_rows:
+                output.write(''.join(chunk))
+                chunk.clear()
+        output.write(''.join(chunk))
+        output.flush()
+        return count
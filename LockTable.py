@@ -0,0 +1,29 @@
+import threading
+from contextlib import contextmanager, ExitStack
+
+
+class LockTable():
+    """
+    A table of re-entrant locks, one per key, created on first use.
+
+    Locks taken together through holding() are always acquired in sorted key order, so
+    threads holding several locks of the same table cannot deadlock each other.
+    """
+
+    def __init__(self) -> None:
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        lock = self._locks.get(key)
+        if lock is None:
+            with self._lock:
+                lock = self._locks.setdefault(key, threading.RLock())
+        return lock
+
+    @contextmanager
+    def holding(self, keys):
+        with ExitStack() as stack:
+            for key in sorted(set(keys)):
+                stack.enter_context(self[key])
+            yield
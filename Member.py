@@ -1,14 +1,16 @@
 from Customer import Customer
+from Money import apply_discount
 
 
 class Member(Customer):
+    __slots__ = ()
     _discount_rate = 0.05
 
-    def __init__(self, id: str, name: str, value: float = 0) -> None:
+    def __init__(self, id: str, name: str, value: int = 0) -> None:
         super().__init__(id, name, value)
     
     def get_discount(self, price):
-        new_price = price * (1 - self.discount_rate)
+        new_price = apply_discount(price, self.discount_rate)
         return (self.discount_rate, new_price)
 
     @property
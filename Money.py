@@ -0,0 +1,89 @@
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Amounts of money are ints counting 1/SCALE of a dollar, cents by default. The scale
+# has to be chosen before any records are loaded, and files keep amounts in dollars
+# with DECIMALS places, so they read the same at any scale.
+DECIMALS = 2
+SCALE = 10 ** DECIMALS
+
+# Discount rates are applied as whole millionths, so the same rate always takes off
+# the same amount whatever its float rounding
+RATE_SCALE = 1_000_000
+
+
+def to_cents(amount):
+    """
+    Converts an amount in dollars, given as a str, float, int or Decimal, to an int of
+    1/SCALE dollars. Amounts with more places than DECIMALS, such as the drifted floats
+    written by earlier versions, are rounded half to even.
+    """
+    if isinstance(amount, int):
+        return amount * SCALE
+    if isinstance(amount, float):
+        # The shortest repr is the decimal the float was written as
+        amount = repr(amount)
+    if isinstance(amount, str):
+        # Nearly every amount in the files is a plain decimal, which int() reads faster
+        # than Decimal
+        text = amount.strip()
+        negative = text[:1] == '-'
+        whole, _, fraction = text[negative:].partition('.')
+        if len(fraction) <= DECIMALS and (whole or fraction) and (whole.isdecimal() or not whole) \
+                and (fraction.isdecimal() or not fraction):
+            cents = int(whole or 0) * SCALE + int(fraction.ljust(DECIMALS, '0') or 0)
+            return -cents if negative else cents
+    try:
+        return int((Decimal(amount) * SCALE).quantize(1, ROUND_HALF_EVEN))
+    except InvalidOperation:
+        raise ValueError(f'invalid amount of money: {amount!r}') from None
+
+
+def format_money(cents):
+    """Formats an int of 1/SCALE dollars as dollars with DECIMALS places, such as 2247.70."""
+    if cents is None:
+        return ''
+    sign = '-' if cents < 0 else ''
+    whole, fraction = divmod(abs(cents), SCALE)
+    return f'{sign}{whole}.{fraction:0{DECIMALS}d}' if DECIMALS else f'{sign}{whole}'
+
+
+def to_dollars(cents):
+    """The float nearest to an amount, for JSON and other outputs without decimals."""
+    return None if cents is None else cents / SCALE
+
+
+def rate_units(rate: float):
+    return round(rate * RATE_SCALE)
+
+
+def _divide(numerator: int, denominator: int):
+    # Integer division rounding half to even, so that halves do not all round one way
+    quotient, remainder = divmod(numerator, denominator)
+    if 2 * remainder > denominator or 2 * remainder == denominator and quotient & 1:
+        quotient += 1
+    return quotient
+
+
+def apply_discount(cents: int, rate: float):
+    """The amount left once a discount rate is taken off, rounded half to even."""
+    return _divide(cents * (RATE_SCALE - rate_units(rate)), RATE_SCALE)
+
+
+def apply_discounts(cents, rates):
+    """
+    apply_discount() over arrays, giving an int64 array the same as applying it to each
+    amount in turn. Amounts must stay below 2**63 / RATE_SCALE, about 92 billion dollars.
+
+    Args:
+        cents (ndarray of int64): The amounts
+        rates (ndarray of float64): The discount rate for each amount
+    """
+    numerators = np.asarray(cents, dtype=np.int64) * (RATE_SCALE - np.rint(np.asarray(rates) * RATE_SCALE).astype(np.int64))
+    quotients, remainders = np.divmod(numerators, RATE_SCALE)
+    round_up = (2 * remainders > RATE_SCALE) | ((2 * remainders == RATE_SCALE) & (quotients & 1 == 1))
+    return quotients + round_up
@@ -0,0 +1,122 @@
+import bisect
+import heapq
+from collections import Counter, defaultdict
+
+
+def normalise(name: str):
+    return ' '.join(name.casefold().split())
+
+
+def trigrams(name: str):
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex():
+    """
+    Suggests customers or products for a name which is incomplete or misspelt.
+
+    A query is first looked up as a prefix of any word of the names, so 'kett' finds
+    'Electric kettle'. Prefixes are found by bisecting a sorted list of every word
+    suffix of every name, which answers the same queries as a trie at a fraction of
+    its memory in Python. If that gives fewer than the suggestions asked for, the
+    rest are names sharing the most trigrams with the query. Names are compared
+    case-insensitively and with their whitespace collapsed.
+
+    Args:
+        items (iterable, optional): The customers or products to index
+        key (callable, optional): Gives the name of an item
+        max_postings (int, optional): The number of trigram occurrences counted for a
+            fuzzy query. The commonest trigrams of the query are skipped beyond it
+        min_similarity (float, optional): The share of the query's trigrams a name
+            needs to be suggested
+    """
+
+    def __init__(self, items=(), key=lambda item: item.name, max_postings: int = 10_000,
+                 min_similarity: float = 0.5) -> None:
+        self._key = key
+        self.max_postings = max_postings
+        self.min_similarity = min_similarity
+        self._items = []
+        self._names = []
+        self._words = []
+        self._trigrams = defaultdict(list)
+        for item in items:
+            self._add(item)
+        self._words.sort()
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        words = self._add(item)
+        del self._words[-len(words):]
+        for word in words:
+            bisect.insort(self._words, word)
+
+    def _add(self, item):
+        number = len(self._items)
+        name = normalise(self._key(item))
+        self._items.append(item)
+        self._names.append(name)
+        postings = self._trigrams
+        for trigram in trigrams(name):
+            postings[trigram].append(number)
+        # Every word suffix of the name, so that a query can start at any word
+        words = []
+        start = 0
+        for word in name.split(' '):
+            words.append((name[start:], number))
+            start += len(word) + 1
+        self._words.extend(words)
+        return words
+
+    def search(self, query: str, limit: int = 10):
+        """
+        Returns:
+            list: At most limit items, the best suggestion first
+        """
+        query = normalise(query)
+        if not query or limit <= 0:
+            return []
+        numbers = self._search_prefix(query, limit)
+        if len(numbers) < limit:
+            numbers += [n for n in self._search_fuzzy(query, limit) if n not in numbers][:limit - len(numbers)]
+        return [self._items[number] for number in numbers]
+
+    def _search_prefix(self, query: str, limit: int):
+        # Short prefixes can match most of the names, so only the first matches in
+        # alphabetical order are ranked
+        scanned = max(50 * limit, 500)
+        matches = {}
+        i = bisect.bisect_left(self._words, (query,))
+        for word, number in self._words[i:i + scanned]:
+            if not word.startswith(query):
+                break
+            name = self._names[number]
+            # Whole names before names with a word starting with the query, and
+            # shorter names before longer ones
+            matches[number] = (name != query, len(word) != len(name), len(name), number)
+        return heapq.nsmallest(limit, matches, key=matches.get)
+
+    def _search_fuzzy(self, query: str, limit: int):
+        query_trigrams = trigrams(query)
+        postings = sorted((self._trigrams[t] for t in query_trigrams if t in self._trigrams), key=len)
+        # The rarest trigrams of the query narrow down the candidates the most, and
+        # counting stops once max_postings occurrences were counted
+        counts = Counter()
+        budget = self.max_postings
+        for numbers in postings:
+            if budget <= 0:
+                break
+            counts.update(numbers[:budget])
+            budget -= len(numbers)
+
+        ranked = []
+        for number, _ in counts.most_common(4 * limit):
+            name_trigrams = trigrams(self._names[number])
+            shared = len(query_trigrams & name_trigrams)
+            similarity = shared / len(query_trigrams)
+            if similarity >= self.min_similarity:
+                ranked.append((-similarity, -shared / len(query_trigrams | name_trigrams), number))
+        return [number for *_, number in sorted(ranked)[:limit]]
@@ -0,0 +1,98 @@
+import os
+from Customer import Customer
+from PersistentStorageManager import PersistentStorageManager
+
+
+class OffsetStorageManager(PersistentStorageManager):
+    """
+    A PersistentStorageManager which updates customer and product records in place.
+
+    While reading the customer and product files, the byte offset and length of every
+    line is remembered by record id. An update then seeks to the record and overwrites
+    it, padding the last field with spaces so the line keeps its length. Only when a
+    record outgrows its slot is the file rewritten, and the rewritten record is given
+    `slack` bytes of padding so it can grow again without another rewrite.
+
+    The padded files stay readable by PersistentStorageManager, since int() and
+    to_cents() ignore the trailing whitespace.
+
+    Args:
+        customer_file_path (str): The file path to the customer storage file
+        product_file_path (str): The file path to the product storage file
+        orders_file_path (str, optional): The file path to the orders storage file
+        slack (int, optional): Spare bytes given to new and outgrown records
+    """
+
+    def __init__(self, customer_file_path: str, product_file_path: str, orders_file_path: str = None, slack: int = 8) -> None:
+        super().__init__(customer_file_path, product_file_path, orders_file_path)
+        self.slack = slack
+        self._offsets = {}
+
+    def csv_reader(self, file_path):
+        offsets = {}
+        self._offsets[file_path] = offsets
+        offset = 0
+        try:
+            with open(file_path, 'rb') as f:
+                for raw_line in f:
+                    args = raw_line.decode('utf-8').split(', ')
+                    offsets[args[0]] = (offset, len(raw_line))
+                    offset += len(raw_line)
+                    yield args
+        except FileNotFoundError as e:
+            print('Customer data file not found. Exiting...')
+            raise e
+
+    def snapshot_state(self):
+        return self._offsets
+
+    def restore_snapshot_state(self, state):
+        # The records were not read, so their offsets come from the snapshot
+        self._offsets = state
+
+    def save_customer(self, customer: Customer):
+        offsets = self._offsets.setdefault(self.customer_file_path, {})
+        record = self._pad(self.format_customer(customer).encode('utf-8'), self.slack)
+        try:
+            with self._file_locks[self.customer_file_path]:
+                with open(self.customer_file_path, 'ab') as f:
+                    offsets[customer.id] = (f.seek(0, os.SEEK_END), len(record))
+                    f.write(record)
+        except IOError as e:
+            print('Error saving customer to file. Exitting...')
+            raise e
+
+    def _rewrite_records(self, file_path: str, lines):
+        with self._file_locks[file_path]:
+            offsets = self._offsets.setdefault(file_path, {})
+            outgrown = {}
+            with open(file_path, 'r+b') as f:
+                for id, line in lines.items():
+                    record = line.encode('utf-8')
+                    slot = offsets.get(id)
+                    if slot is None or len(record) + 1 > slot[1]:
+                        outgrown[id] = self._pad(record, self.slack)
+                        continue
+                    offset, length = slot
+                    f.seek(offset)
+                    f.write(self._pad(record, length - len(record) - 1))
+            if outgrown:
+                self._rewrite_file(file_path, outgrown)
+
+    def _rewrite_file(self, file_path: str, records):
+        offsets = {}
+        offset = 0
+        with open(file_path, 'rb') as f:
+            with self._replacing(file_path, 'wb') as f_new:
+                for raw_line in f:
+                    id = raw_line.split(b', ', 1)[0].decode('utf-8')
+                    raw_line = records.get(id, raw_line)
+                    offsets[id] = (offset, len(raw_line))
+                    offset += len(raw_line)
+                    f_new.write(raw_line)
+
+        self._offsets[file_path] = offsets
+
+    @staticmethod
+    def _pad(record: bytes, padding: int):
+        return record + b' ' * padding + b'\n'
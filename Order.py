@@ -1,12 +1,16 @@
-import datetime
+from OrderClock import CLOCK, parse_timestamp
 
 class Order():
-    def __init__(self, customer: str, product: str, quantity: int, purchased_VIP: bool = False, timestamp = datetime.datetime.now()) -> None:
+    __slots__ = ('customer', 'product', 'quantity', 'purchased_VIP', 'timestamp')
+
+    def __init__(self, customer: str, product: str, quantity: int, purchased_VIP: bool = False, timestamp=None) -> None:
         self.customer = customer
         self.product = product
         self.quantity = quantity
         self.purchased_VIP = purchased_VIP
-        self.timestamp = timestamp
+        # Microseconds since the epoch, see OrderClock. Orders without a timestamp are
+        # placed now
+        self.timestamp = CLOCK.now() if timestamp is None else parse_timestamp(timestamp)
 
 
     def __iter__(self):
@@ -0,0 +1,101 @@
+import datetime
+import functools
+import threading
+import time
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+QUARTER_HOUR = 15 * 60 * 1_000_000
+
+
+@functools.lru_cache(maxsize=1 << 12)
+def _hour_micros(hour: str):
+    return to_micros(datetime.datetime.fromisoformat(hour + ':00:00'))
+
+
+def to_micros(moment: datetime.datetime):
+    """Microseconds since the epoch of a datetime, naive ones being in local time."""
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return (moment - EPOCH) // MICROSECOND
+
+
+# Bounds of the timestamps which can be formatted in any time zone
+EARLIEST = to_micros(datetime.datetime(1, 1, 2, tzinfo=datetime.timezone.utc))
+LATEST = to_micros(datetime.datetime(9999, 12, 31, tzinfo=datetime.timezone.utc))
+
+
+def parse_timestamp(value):
+    """
+    Reads a timestamp as microseconds since the epoch. Timestamps may be given as
+    microseconds already, as they are stored, as a datetime or as an ISO 8601 string
+    such as the ones made by format_timestamp(). Strings without a UTC offset, like the
+    local times earlier versions stored, are read as local time.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, datetime.datetime):
+        return to_micros(value)
+    text = value.strip()
+    if text.isdigit():
+        return int(text)
+    # Order files from earlier versions hold local 'YYYY-MM-DD HH:MM:SS[.ffffff]' times,
+    # whose hour is converted once and cached, as the conversion to the epoch is the
+    # slow part
+    if (len(text) == 19 or len(text) == 26 and text[19] == '.') and text[13] == text[16] == ':' and text[10] in ' T':
+        try:
+            micros = _hour_micros(text[:13]) + int(text[14:16]) * 60_000_000 + int(text[17:19]) * 1_000_000
+            return micros + (int(text[20:26]) if len(text) == 26 else 0)
+        except ValueError:
+            pass
+    return to_micros(datetime.datetime.fromisoformat(text))
+
+
+@functools.lru_cache(maxsize=1 << 12)
+def _day_of_quarter(quarter: int):
+    return format_timestamp(quarter * QUARTER_HOUR)[:10]
+
+
+def day_of(timestamp):
+    """The local day of a timestamp as YYYY-MM-DD."""
+    # Every time zone changes its offset on a quarter hour, so each quarter hour lies
+    # within one day and its day only has to be worked out once
+    return _day_of_quarter(parse_timestamp(timestamp) // QUARTER_HOUR)
+
+
+def format_timestamp(micros: int):
+    """
+    Formats microseconds since the epoch for display, as a local
+    'YYYY-MM-DD HH:MM:SS.ffffff+HH:MM'. The UTC offset tells apart the times repeated
+    when the clocks go back.
+    """
+    return (EPOCH + micros * MICROSECOND).astimezone().isoformat(' ', 'microseconds')
+
+
+class OrderClock():
+    """
+    Gives orders their timestamp, in microseconds since the epoch. Timestamps only ever
+    increase, even if the system clock is set back, and no two orders get the same
+    timestamp: an order placed in the same microsecond as the last one, or while the
+    clock is behind, gets the last timestamp plus one. Timestamps therefore also number
+    the orders in the sequence they were placed.
+
+    Args:
+        clock (callable, optional): Gives the current time in nanoseconds since the epoch
+    """
+
+    def __init__(self, clock=time.time_ns) -> None:
+        self._clock = clock
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def now(self):
+        micros = self._clock() // 1000
+        with self._lock:
+            if micros <= self._last:
+                micros = self._last + 1
+            self._last = micros
+        return micros
+
+
+CLOCK = OrderClock()
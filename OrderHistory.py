@@ -0,0 +1,288 @@
+import bisect
+import gzip
+import hashlib
+import lzma
+import mmap
+import os
+import pickle
+from array import array
+from OrderClock import parse_timestamp
+
+# The compression an order file can be archived with, and the suffix it then gets
+CODECS = {
+    'gzip': (gzip, '.gz'),
+    'lzma': (lzma, '.xz'),
+}
+
+
+class OrderHistory():
+    """
+    A read-only sequence of the orders in an order file, which only parses the orders
+    that are asked for. Iterating streams the file in chunks. Indexing, slicing and len()
+    build an index of line offsets on first use and then read single lines through a
+    memory map. Orders placed after the history was opened are kept in memory and follow
+    the orders from the file.
+
+    The pass which builds the line offsets also records the positions of every
+    customer's orders, so a customer's history can be read without scanning all orders.
+    The timestamps of all orders are indexed in sorted order on the first time range
+    query, so orders between two times are found by a binary search.
+    The index can be saved next to the order file, in which case a later history only
+    has to index the orders appended to the file since. The saved index records a hash
+    of the part of the file it describes, and is ignored should that part have changed.
+
+    An order file compressed with one of the CODECS is decompressed as it is streamed.
+    Compressed files cannot be memory mapped, so the first read of a single line
+    decompresses the whole file into memory instead, and their index is never saved.
+
+    Args:
+        file_path (str): The path to the order file. A missing file is an empty history
+        parse_order (callable): Creates an Order from a line of the order file
+        format_order (callable): Formats an Order as a line of the order file
+        chunk_size (int, optional): The number of bytes read at a time
+        codec (str, optional): The codec the order file is compressed with, if any
+
+    Attributes:
+        file_path (str): The path to the order file
+    """
+
+    def __init__(self, file_path: str, parse_order, format_order, chunk_size: int = 1 << 20, codec: str = None) -> None:
+        if codec is not None and codec not in CODECS:
+            raise ValueError(f'Unknown codec {codec}, expected one of {", ".join(CODECS)}')
+        self.file_path = file_path
+        self.codec = codec
+        self._parse_order = parse_order
+        self._format_order = format_order
+        self._chunk_size = chunk_size
+        self._file_size = os.path.getsize(file_path) if file_path is not None and os.path.exists(file_path) else 0
+        self._data = None
+        self._offsets = None
+        self._by_customer = None
+        self._times = None
+        self._time_positions = None
+        self._mmap = None
+        self._appended = []
+
+    def __len__(self):
+        return len(self._line_offsets()) - 1 + len(self._appended)
+
+    def __iter__(self):
+        for line in self._iter_lines():
+            yield self._parse_order(line)
+        yield from self._appended
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        offsets = self._line_offsets()
+        file_length = len(offsets) - 1
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('order index out of range')
+        if index >= file_length:
+            return self._appended[index - file_length]
+        return self._parse_order(self._read_line(offsets[index], offsets[index + 1]))
+
+    def append(self, order):
+        self.append_line(self._format_order(order))
+
+    def append_line(self, line: str):
+        """Adds an order appended to the order file as line after the history was opened."""
+        order = self._parse_order(line)
+        self._appended.append(order)
+        if self._by_customer is not None:
+            positions = self._by_customer.setdefault(order.customer, array('q'))
+            positions.append(len(self) - 1)
+        if self._times is not None:
+            self._index_time(order.timestamp, len(self._times))
+
+    def positions_of_customer(self, customer_id: str):
+        self._line_offsets()
+        return self._by_customer.get(customer_id, array('q'))
+
+    def orders_of_customer(self, customer_id: str):
+        for position in self.positions_of_customer(customer_id):
+            yield self[position]
+
+    def orders_between(self, start: int, end: int):
+        """
+        Yields the orders placed from start up to but not including end, oldest first.
+
+        Args:
+            start (int): The first time, in microseconds since the epoch
+            end (int): The time after the last order, in microseconds since the epoch
+        """
+        times, positions = self._time_index()
+        for i in range(bisect.bisect_left(times, start), bisect.bisect_left(times, end)):
+            yield self[i if positions is None else positions[i]]
+
+    @property
+    def index_file_path(self):
+        return self.file_path + '.idx'
+
+    def save_index(self):
+        if self.file_path is None or self._offsets is None or self.codec is not None:
+            return
+        file_length = len(self._offsets) - 1
+        by_customer = {}
+        for customer_id, positions in self._by_customer.items():
+            positions = array('q', (p for p in positions if p < file_length))
+            if positions:
+                by_customer[customer_id] = positions
+        end = self._offsets[-1]
+        stat = os.stat(self.file_path) if end > 0 else None
+        index = {'offsets': self._offsets, 'by_customer': by_customer, 'digest': self._prefix_digest(end),
+                 'size': stat.st_size if stat else 0, 'mtime_ns': stat.st_mtime_ns if stat else 0}
+        with open(self.index_file_path, 'wb') as f:
+            pickle.dump(index, f)
+
+    def extend(self, orders):
+        for order in orders:
+            self.append(order)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._data = None
+
+    def _iter_chunks(self, start: int = 0):
+        if self.codec is not None:
+            yield from self._iter_decompressed_chunks(start)
+            return
+        if self._file_size <= start:
+            return
+        remaining = self._file_size - start
+        with open(self.file_path, 'rb') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(self._chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def _iter_decompressed_chunks(self, start: int = 0):
+        # The size of the decompressed orders is unknown, so they are read to the end
+        if not self._file_size:
+            return
+        with CODECS[self.codec][0].open(self.file_path, 'rb') as f:
+            f.seek(start)
+            while True:
+                chunk = f.read(self._chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _iter_raw_lines(self, start: int = 0):
+        rest = b''
+        for chunk in self._iter_chunks(start):
+            lines = (rest + chunk).split(b'\n')
+            rest = lines.pop()
+            for line in lines:
+                yield line + b'\n'
+        if rest:
+            yield rest
+
+    def _iter_lines(self):
+        for line in self._iter_raw_lines():
+            yield line.decode('utf-8')
+
+    def _line_offsets(self):
+        if self._offsets is not None:
+            return self._offsets
+
+        offsets, by_customer = self._load_index()
+        offset = offsets[-1]
+        for line in self._iter_raw_lines(offset):
+            customer_id = line.split(b', ', 1)[0].decode('utf-8')
+            by_customer.setdefault(customer_id, array('q')).append(len(offsets) - 1)
+            offset += len(line)
+            offsets.append(offset)
+
+        for position, order in enumerate(self._appended, len(offsets) - 1):
+            by_customer.setdefault(order.customer, array('q')).append(position)
+        self._offsets = offsets
+        self._by_customer = by_customer
+        return offsets
+
+    def _time_index(self):
+        """
+        The timestamps of the orders in ascending order, and the position in the history
+        of each, or None for the positions while the orders are in time order anyway.
+        """
+        if self._times is not None:
+            return self._times, self._time_positions
+
+        times = array('q', (parse_timestamp(line.rsplit(b', ', 1)[-1].decode('utf-8'))
+                            for line in self._iter_raw_lines()))
+        times.extend(order.timestamp for order in self._appended)
+        if any(times[i] > times[i + 1] for i in range(len(times) - 1)):
+            # Orders from before timestamps were monotonic may be out of order
+            order = sorted(range(len(times)), key=times.__getitem__)
+            self._time_positions = array('q', order)
+            times = array('q', (times[i] for i in order))
+        self._times = times
+        return times, self._time_positions
+
+    def _index_time(self, timestamp: int, position: int):
+        times = self._times
+        if self._time_positions is None:
+            if not times or times[-1] <= timestamp:
+                times.append(timestamp)
+                return
+            self._time_positions = array('q', range(len(times)))
+        i = bisect.bisect_right(times, timestamp)
+        times.insert(i, timestamp)
+        self._time_positions.insert(i, position)
+
+    def _load_index(self):
+        """
+        Loads the saved index, if it still describes a prefix of the order file. The
+        order file is only ever appended to, so orders after the saved prefix can be
+        indexed on top of it. Unless the file is untouched since the index was saved, the
+        prefix is hashed to check it is the one indexed.
+        """
+        empty = array('q', [0]), {}
+        if self.file_path is None or self.codec is not None or not os.path.exists(self.index_file_path):
+            return empty
+        try:
+            with open(self.index_file_path, 'rb') as f:
+                index = pickle.load(f)
+            offsets = index['offsets']
+            end = offsets[-1]
+            if end > self._file_size:
+                return empty
+            if end > 0:
+                stat = os.stat(self.file_path)
+                if (stat.st_size, stat.st_mtime_ns) != (index['size'], index['mtime_ns']) \
+                        and self._prefix_digest(end) != index['digest']:
+                    return empty
+            return offsets, index['by_customer']
+        except Exception:
+            return empty
+
+    def _prefix_digest(self, end: int):
+        digest = hashlib.blake2b(digest_size=16)
+        if end > 0:
+            with open(self.file_path, 'rb') as f:
+                while end > 0:
+                    chunk = f.read(min(self._chunk_size, end))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    end -= len(chunk)
+        return digest.hexdigest()
+
+    def _read_line(self, start: int, end: int):
+        if self.codec is not None:
+            if self._data is None:
+                with CODECS[self.codec][0].open(self.file_path, 'rb') as f:
+                    self._data = f.read()
+            return self._data[start:end].decode('utf-8')
+        if self._mmap is None:
+            with open(self.file_path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), self._file_size, access=mmap.ACCESS_READ)
+        return self._mmap[start:end].decode('utf-8')
@@ -0,0 +1,346 @@
+import bisect
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from OrderClock import day_of, parse_timestamp
+from OrderHistory import CODECS, OrderHistory
+
+MANIFEST_VERSION = 1
+# A manifest lock left older than this by a process that stopped is taken over
+STALE_LOCK_SECONDS = 30
+
+
+class OrderLog():
+    """
+    The order history kept as a directory of segment files, a new one for every day
+    and whenever the current one grows past `max_segment_bytes`, together with a
+    manifest.json recording the file, time range, number of orders and size of each
+    segment. Segments use the line format of the order file.
+
+    Only the last segment is written to. Once a later one is started it is closed and
+    never changes again, so it can be compressed or moved elsewhere without rewriting
+    anything but the manifest. archive() compresses closed segments with one of the
+    CODECS, which the manifest records per segment, and they are read through the same
+    streaming iterator as the others.
+
+    Opening the log only reads the manifest, and time range queries only read the
+    segments overlapping the range. The manifest is written whenever a segment is
+    closed and when the log is closed; should the program stop in between, the last
+    segment's entry is brought up to date on the next start.
+
+    Another process, such as `main.py archive`, may change the manifest while the log
+    is open. The manifest is only changed under a lock file, by reading it again and
+    replacing just the entries of the segments this log changed, so neither process
+    overwrites what the other wrote.
+
+    Like SQLiteOrderHistory, the log is saved to by its storage manager, so appending
+    orders to it as a history does nothing.
+
+    When a new log is created in `directory`, an existing order file of the same name
+    with a .csv extension is moved into it as its first, closed segment. Should such a
+    file turn up again next to an existing log, written by a run that did not use the
+    log, its orders are merged into the log's segments before the file is removed.
+
+    Args:
+        directory (str): The directory of the segments and the manifest
+        parse_order (callable): Creates an Order from a line of a segment
+        format_order (callable): Formats an Order as a line of a segment
+        max_segment_bytes (int, optional): The size past which a new segment is started
+
+    Attributes:
+        directory (str): The directory of the segments and the manifest
+    """
+
+    def __init__(self, directory: str, parse_order, format_order, max_segment_bytes: int = 64 << 20) -> None:
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self._parse_order = parse_order
+        self._format_order = format_order
+        self._lock = threading.RLock()
+        self._histories = {}
+        # The segments, by _key(), whose entries this log changed since the manifest was saved
+        self._changed = set()
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.manifest_file_path):
+            self._segments = self._read_manifest()
+            self._recover_last_segment()
+            self._merge(directory.rstrip('/' + os.sep) + '.csv')
+        else:
+            self._segments = []
+            self._adopt(directory.rstrip('/' + os.sep) + '.csv')
+            self._save_manifest()
+
+    @property
+    def manifest_file_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    @property
+    def lock_file_path(self):
+        return os.path.join(self.directory, 'manifest.lock')
+
+    @property
+    def segments(self):
+        """The manifest entries of the segments, oldest first."""
+        with self._lock:
+            return [dict(segment) for segment in self._segments]
+
+    def segment_file_path(self, segment):
+        return os.path.join(self.directory, segment['file'])
+
+    def __len__(self):
+        with self._lock:
+            return sum(segment['rows'] for segment in self._segments)
+
+    def __iter__(self):
+        for segment in self.segments:
+            yield from self._history(segment)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        with self._lock:
+            starts = []
+            total = 0
+            for segment in self._segments:
+                starts.append(total)
+                total += segment['rows']
+            if index < 0:
+                index += total
+            if index < 0 or index >= total:
+                raise IndexError('order index out of range')
+            i = bisect.bisect_right(starts, index) - 1
+            return self._history(self._segments[i])[index - starts[i]]
+
+    def append(self, order):
+        pass
+
+    def extend(self, orders):
+        pass
+
+    def orders_of_customer(self, customer_id: str):
+        for segment in self.segments:
+            yield from self._history(segment).orders_of_customer(customer_id)
+
+    def orders_between(self, start: int, end: int):
+        for segment in self.segments:
+            if segment['rows'] and segment['first'] < end and segment['last'] >= start:
+                yield from self._history(segment).orders_between(start, end)
+
+    def write(self, lines):
+        """
+        Appends lines of the order file format to the last segment, starting a new
+        segment first whenever an order falls on another day than the segment or the
+        segment is full.
+        """
+        with self._lock:
+            batch = []
+            segment = self._segments[-1] if self._segments and not self._segments[-1]['closed'] else None
+            for line in lines:
+                timestamp = parse_timestamp(line.rsplit(', ', 1)[-1])
+                day = day_of(timestamp)
+                if segment is None or segment['day'] != day or segment['bytes'] >= self.max_segment_bytes:
+                    self._write_lines(segment, batch)
+                    batch = []
+                    segment = self._start_segment(day)
+                batch.append(line)
+                self._changed.add(self._key(segment))
+                size = len(line.encode('utf-8'))
+                segment['bytes'] += size
+                segment['rows'] += 1
+                segment['first'] = timestamp if segment['first'] is None else min(segment['first'], timestamp)
+                segment['last'] = timestamp if segment['last'] is None else max(segment['last'], timestamp)
+            self._write_lines(segment, batch)
+
+    def archive(self, codec: str = 'gzip', before: int = None):
+        """
+        Compresses the closed segments which are not compressed yet, or only those whose
+        last order was placed before `before`. Each is compressed next to the original,
+        which is removed once the manifest refers to the compressed file instead.
+
+        Args:
+            codec (str, optional): One of CODECS
+            before (int, optional): A time in microseconds since the epoch
+        Returns:
+            list of dict: The manifest entries of the segments archived
+        """
+        module, suffix = CODECS[codec]
+        archived = []
+        for segment in self.segments:
+            if not segment['closed'] or segment.get('codec') is not None:
+                continue
+            if before is not None and segment['last'] is not None and segment['last'] >= before:
+                continue
+            source = self.segment_file_path(segment)
+            file_name = segment['file'] + suffix
+            # Closed segments do not change, so they are compressed without holding the lock
+            fd, temp_file_path = tempfile.mkstemp(prefix='archive_', suffix='_temp', dir=self.directory)
+            try:
+                with open(source, 'rb') as f, open(fd, 'wb') as f_raw, module.open(f_raw, 'wb') as f_archive:
+                    shutil.copyfileobj(f, f_archive, 1 << 20)
+                os.replace(temp_file_path, os.path.join(self.directory, file_name))
+            except BaseException:
+                os.remove(temp_file_path)
+                raise
+
+            with self._lock:
+                entry = next(entry for entry in self._segments if entry['file'] == segment['file'])
+                entry.update(file=file_name, codec=codec, raw_bytes=entry['bytes'],
+                             bytes=os.path.getsize(os.path.join(self.directory, file_name)))
+                self._changed.add(self._key(entry))
+                self._save_manifest()
+                history = self._histories.pop(segment['file'], None)
+                if history is not None:
+                    history.close()
+                archived.append(dict(entry))
+            os.remove(source)
+        return archived
+
+    def save_index(self):
+        with self._lock:
+            for history in self._histories.values():
+                history.save_index()
+
+    def close(self):
+        with self._lock:
+            for history in self._histories.values():
+                history.close()
+            self._histories.clear()
+            if self._changed:
+                self._save_manifest()
+
+    def _write_lines(self, segment, lines):
+        if not lines:
+            return
+        with open(self.segment_file_path(segment), 'a', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        history = self._histories.get(segment['file'])
+        if history is not None:
+            for line in lines:
+                history.append_line(line)
+
+    def _start_segment(self, day: str):
+        if self._segments and not self._segments[-1]['closed']:
+            self._segments[-1]['closed'] = True
+            self._changed.add(self._key(self._segments[-1]))
+        number = sum(1 for segment in self._segments if segment['day'] == day)
+        segment = {'file': f'orders-{day}-{number:03d}.csv', 'day': day, 'first': None, 'last': None,
+                   'rows': 0, 'bytes': 0, 'closed': False}
+        self._segments.append(segment)
+        self._changed.add(self._key(segment))
+        self._save_manifest()
+        return segment
+
+    def _history(self, segment):
+        with self._lock:
+            history = self._histories.get(segment['file'])
+            if history is None:
+                history = OrderHistory(self.segment_file_path(segment), self._parse_order, self._format_order,
+                                       codec=segment.get('codec'))
+                self._histories[segment['file']] = history
+            return history
+
+    def _describe(self, file_name: str, day: str = None, closed: bool = True):
+        history = OrderHistory(os.path.join(self.directory, file_name), self._parse_order, self._format_order)
+        times, _ = history._time_index()
+        history.close()
+        return {'file': file_name, 'day': day, 'first': times[0] if times else None,
+                'last': times[-1] if times else None, 'rows': len(times),
+                'bytes': os.path.getsize(os.path.join(self.directory, file_name)), 'closed': closed}
+
+    def _adopt(self, file_path: str):
+        if not os.path.exists(file_path):
+            return
+        file_name = 'orders-legacy.csv'
+        os.replace(file_path, os.path.join(self.directory, file_name))
+        self._segments.append(self._describe(file_name))
+        self._changed.add(file_name)
+
+    def _merge(self, file_path: str):
+        if not os.path.exists(file_path):
+            return
+        with open(file_path, 'r', encoding='utf-8') as f:
+            lines = [line if line.endswith('\n') else line + '\n' for line in f if line.strip()]
+        self.write(lines)
+        self._save_manifest()
+        # Removed only once its orders are in the log, so that a failure part way leaves
+        # orders twice rather than losing them
+        os.remove(file_path)
+
+    def _recover_last_segment(self):
+        if not self._segments or self._segments[-1]['closed']:
+            return
+        segment = self._segments[-1]
+        file_path = self.segment_file_path(segment)
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        if size != segment['bytes']:
+            # Orders were written after the manifest was last saved
+            if size == 0:
+                segment.update(first=None, last=None, rows=0, bytes=0)
+            else:
+                segment.update(self._describe(segment['file'], segment['day'], closed=False))
+            self._changed.add(self._key(segment))
+            self._save_manifest()
+
+    @staticmethod
+    def _key(segment):
+        # The file name a segment was started with, which archiving adds a suffix to
+        if segment.get('codec') is None:
+            return segment['file']
+        return segment['file'][:-len(CODECS[segment['codec']][1])]
+
+    def _read_manifest(self):
+        with open(self.manifest_file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)['segments']
+
+    @contextlib.contextmanager
+    def _manifest_lock(self):
+        while True:
+            try:
+                fd = os.open(self.lock_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_file_path) > STALE_LOCK_SECONDS:
+                        os.remove(self.lock_file_path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.01)
+        try:
+            os.write(fd, str(os.getpid()).encode('ascii'))
+            os.close(fd)
+            yield
+        finally:
+            os.remove(self.lock_file_path)
+
+    def _save_manifest(self):
+        with self._lock, self._manifest_lock():
+            changed = {self._key(segment): segment for segment in self._segments
+                       if self._key(segment) in self._changed}
+            segments = []
+            if os.path.exists(self.manifest_file_path):
+                # Entries changed by another process since this log read them are kept
+                for segment in self._read_manifest():
+                    key = self._key(segment)
+                    segments.append(changed.pop(key, segment))
+            segments.extend(segment for segment in self._segments if self._key(segment) in changed)
+            for segment in segments:
+                history = self._histories.get(self._key(segment))
+                if history is not None and segment['file'] != self._key(segment):
+                    # Archived elsewhere, so the plain segment file is gone
+                    history.close()
+                    del self._histories[self._key(segment)]
+            fd, temp_file_path = tempfile.mkstemp(prefix='manifest_', suffix='_temp', dir=self.directory)
+            try:
+                with open(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'version': MANIFEST_VERSION, 'segments': segments}, f, indent=1)
+                os.replace(temp_file_path, self.manifest_file_path)
+            except BaseException:
+                os.remove(temp_file_path)
+                raise
+            self._segments = segments
+            self._changed.clear()
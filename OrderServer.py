@@ -0,0 +1,230 @@
+import asyncio
+import json
+from urllib.parse import unquote, urlsplit
+from BatchOrderProcessor import BatchOrderProcessor
+from Money import to_dollars
+from OrderClock import format_timestamp
+from Records import Records
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class OrderServer():
+    """
+    A local HTTP/JSON API in front of Records, built on asyncio.
+
+    Reads are answered straight from the in-memory records, except for order histories,
+    which are read in a worker thread. Orders are handed to a single writer task, which
+    takes every order waiting at that moment (up to `batch_size`) and places them
+    together with Records.execute_orders, so concurrent requests share the storage
+    writes. The writer runs the batch in a worker thread so that reads are still served
+    while the files are written. Unexpected errors are answered with a 500.
+
+    Routes:
+        GET  /products                  All products and bundles
+        GET  /products/<name or id>     A single product
+        GET  /customers/<name or id>    A single customer
+        GET  /customers/<name or id>/orders
+                                        The order history of a customer
+        POST /orders                    Place an order. The body is a JSON object with
+                                        customer, product, quantity and optionally membership
+
+    Args:
+        records (Records): The records to serve
+        host (str, optional): The interface to listen on
+        port (int, optional): The port to listen on
+        batch_size (int, optional): The most orders placed by the writer at a time
+    """
+
+    def __init__(self, records: Records, host: str = '127.0.0.1', port: int = 8080, batch_size: int = 1000) -> None:
+        self.records = records
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self._processor = BatchOrderProcessor(records, batch_size)
+        self._queue = None
+        self._writer = None
+        self._server = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_orders())
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        return self._server
+
+    async def serve_forever(self):
+        server = await self.start()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Stops accepting connections and the writer task. Does nothing unless started."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+
+    async def place_order(self, row):
+        if self._writer is None:
+            raise HTTPError(503, 'The server is not accepting orders')
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _write_orders(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            while len(pending) < self.batch_size and not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(None, self._place_orders, [row for row, _ in pending])
+            except Exception as e:
+                results = [e] * len(pending)
+            for (_, future), result in zip(pending, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _place_orders(self, rows):
+        results = [None] * len(rows)
+        orders = []
+        sign_ups = {}
+        for i, row in enumerate(rows):
+            order, reason = self._processor.create_order(row, sign_ups)
+            if order is None:
+                results[i] = {'placed': False, 'reason': reason}
+            else:
+                orders.append((i, order))
+
+        executed = self.records.execute_orders([order for _, order in orders])
+        for (i, order), (placed, reason) in zip(orders, executed):
+            results[i] = {'placed': placed, 'reason': reason}
+            if placed:
+                results[i]['order'] = self._order_to_json(order)
+        return results
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split(maxsplit=2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                try:
+                    status, payload = 200, await self._route(method, urlsplit(target).path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    # Such as an OSError writing the files
+                    status, payload = 500, {'error': str(e) or type(e).__name__}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version.strip() == 'HTTP/1.1'
+                content = json.dumps(payload).encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(content)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes):
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if parts == ['orders']:
+            if method != 'POST':
+                raise HTTPError(405, 'Orders can only be placed with POST')
+            try:
+                row = json.loads(body or b'{}')
+            except ValueError:
+                raise HTTPError(400, 'The body is not valid JSON')
+            if not isinstance(row, dict):
+                raise HTTPError(400, 'The body must be a JSON object')
+            result = await self.place_order(row)
+            if not result['placed']:
+                raise HTTPError(409, result['reason'])
+            return result['order']
+
+        if method != 'GET':
+            raise HTTPError(405, f'{method} is not supported on /{"/".join(parts)}')
+        if parts == ['products']:
+            return [self._product_to_json(product) for product in self.records.products]
+        if len(parts) == 2 and parts[0] == 'products':
+            return self._product_to_json(self._find_product(parts[1]))
+        if len(parts) == 2 and parts[0] == 'customers':
+            return self._customer_to_json(self._find_customer(parts[1]))
+        if len(parts) == 3 and parts[0] == 'customers' and parts[2] == 'orders':
+            customer = self._find_customer(parts[1])
+            # Reading the history can take a while, the first time it is indexed
+            orders = await asyncio.get_running_loop().run_in_executor(None, self.records.orders_of_customer, customer.id)
+            return [self._order_to_json(order) for order in orders]
+        raise HTTPError(404, f'/{"/".join(parts)} does not exist')
+
+    def _find_product(self, query: str):
+        product = self.records.find_product(query, search_in_name=True)
+        if product is None:
+            product = self.records.find_product(query)
+        if product is None:
+            raise HTTPError(404, f'Product {query!r} could not be found')
+        return product
+
+    def _find_customer(self, query: str):
+        customer = self.records.find_customer(query)
+        if customer is None:
+            raise HTTPError(404, f'Customer {query!r} could not be found')
+        return customer
+
+    def _customer_to_json(self, customer):
+        id, name, discount_rate, value = customer
+        return {'id': id, 'name': name, 'discount_rate': discount_rate, 'value': to_dollars(value)}
+
+    def _product_to_json(self, product):
+        product_json = {'id': product.id, 'name': product.name, 'price': to_dollars(product.price),
+                        'stock': product.stock}
+        if product.id.startswith('B'):
+            product_json['products'] = [p.id for p in product.products]
+        return product_json
+
+    def _order_to_json(self, order):
+        customer, product, quantity, purchased_VIP, timestamp = order
+        return {
+            'customer': getattr(customer, 'id', customer),
+            'product': getattr(product, 'id', product),
+            'quantity': int(quantity),
+            'purchased_VIP': purchased_VIP,
+            'timestamp': format_timestamp(timestamp),
+        }
@@ -0,0 +1,224 @@
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from Bundle import Bundle
+from Customer import Customer
+from LockTable import LockTable
+from Member import Member
+from Money import format_money, to_cents
+from Order import Order
+from OrderHistory import OrderHistory
+from OrderLog import OrderLog
+from Product import Product
+from VIPMember import VIPMember
+
+
+class PersistentStorageManager():
+    def __init__(self, customer_file_path: str, product_file_path: str, orders_file_path: str = None) -> None:
+        self.customer_file_path = customer_file_path
+        self.product_file_path = product_file_path
+        self.orders_file_path = orders_file_path
+        self._file_locks = LockTable()
+        # A directory for the orders holds them as an OrderLog of segments
+        self.order_log = None
+        if orders_file_path is not None and os.path.isdir(orders_file_path):
+            self.order_log = OrderLog(orders_file_path, self._create_order, self.format_order)
+
+    def read_customers(self):
+        customers = self.csv_reader(self.customer_file_path)
+        create_customer = lambda args: self._create_customer(*args)
+        return list(map(create_customer, customers))
+
+    def _create_customer(self, id: str, name: str, discount_rate: str, value: str):
+        customer_type = id[0]
+        discount_rate = float(discount_rate)
+        value = to_cents(value)
+        if customer_type == 'C':
+            return Customer(id, name, value)
+        elif customer_type == 'M':
+            return Member(id, name, value)
+        elif customer_type == 'V':
+            return VIPMember(id, name, value, discount_rate)
+
+    def read_products(self):
+        products = self.csv_reader(self.product_file_path)
+        return [self._create_product(*args) for args in products if args[0][0] == 'P']
+
+    def read_bundles(self, product_list):
+        products = {p.id: p for p in product_list}
+        bundles = self.csv_reader(self.product_file_path)
+        return [self._create_bundle(products, args) for args in bundles if args[0][0] == 'B']
+
+    def read_catalog(self):
+        products = {}
+        product_list = []
+        bundle_list = []
+        deferred = []
+        for args in self.csv_reader(self.product_file_path):
+            if args[0][0] == 'P':
+                product = self._create_product(*args)
+                products.setdefault(product.id, product)
+                product_list.append(product)
+            elif args[0][0] == 'B':
+                if all(product_id in products for product_id in args[2:-1]):
+                    bundle_list.append(self._create_bundle(products, args))
+                else:
+                    deferred.append((len(bundle_list), args))
+                    bundle_list.append(None)
+
+        for index, args in deferred:
+            bundle_list[index] = self._create_bundle(products, args)
+        return product_list + bundle_list
+
+    def _create_product(self, id: str, name: str, price: str, stock: str):
+        if not price.strip() == '':
+            price = to_cents(price)
+        else:
+            price = None
+        stock = int(stock)
+        return Product(id, name, price, stock)
+
+    def _create_bundle(self, products, args):
+        id = args[0]
+        name = args[1]
+        products = [products[product_id] for product_id in args[2:-1]]
+        stock = int(args[-1])
+        return Bundle(id, name, products, stock)
+
+    def read_orders(self):
+        if self.order_log is not None:
+            return self.order_log
+        return OrderHistory(self.orders_file_path, self._create_order, self.format_order)
+
+    def _create_order(self, line: str):
+        customer, product, quantity, timestamp = line.split(', ')
+        customer, product = sys.intern(customer), sys.intern(product)
+        return Order(customer, product, quantity, timestamp=timestamp)
+
+    def csv_reader(self, file_path):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield line.split(', ')
+        except FileNotFoundError as e:
+            print('Customer data file not found. Exiting...')
+            raise e
+
+    def format_customer(self, customer: Customer):
+        id, name, discount_rate, value = customer
+        return f'{id}, {name}, {discount_rate}, {format_money(value)}'
+
+    def format_product(self, product: Product):
+        if product.id.startswith('P'):
+            id, name, price, stock = product
+            return f'{id}, {name}, {format_money(price)}, {stock}'
+        elif product.id.startswith('B'):
+            id, name, products, stock = product
+            product_ids = [p.id for p in products]
+            products = ', '.join(product_ids)
+            return f'{id}, {name}, {products}, {stock}'
+
+    def format_order(self, order: Order):
+        return f'{order.customer.id}, {order.product.id}, {order.quantity}, {order.timestamp}\n'
+
+    def save_customer(self, customer: Customer):
+        try:
+            with self._file_locks[self.customer_file_path]:
+                with open(self.customer_file_path, 'a', encoding='utf-8') as f:
+                    f.write(self.format_customer(customer) + '\n')
+        except IOError as e:
+            print('Error saving customer to file. Exitting...')
+            raise e
+
+    def update_customer_info(self, customer: Customer):
+        self.update_customers_info([customer])
+
+    def update_product_info(self, product: Product):
+        self.update_products_info([product])
+
+    def update_customers_info(self, customers):
+        lines = {customer.id: self.format_customer(customer) for customer in customers}
+        self._rewrite_records(self.customer_file_path, lines)
+
+    def update_products_info(self, products):
+        lines = {product.id: self.format_product(product) for product in products}
+        self._rewrite_records(self.product_file_path, lines)
+
+    def _rewrite_records(self, file_path: str, lines):
+        with self._file_locks[file_path]:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                with self._replacing(file_path) as f_new:
+                    for old_line in f:
+                        line = lines.get(old_line.split(', ', 1)[0])
+                        f_new.write(old_line if line is None else line + '\n')
+
+    @contextmanager
+    def _replacing(self, file_path: str, mode: str = 'w'):
+        """
+        Opens a uniquely named temporary file next to file_path, which replaces
+        file_path once it has been written. Concurrent writers never share a
+        temporary file, and a failed write leaves file_path untouched.
+        """
+        directory, file_name = os.path.split(file_path)
+        name, file_extension = os.path.splitext(file_name)
+        fd, temp_file_path = tempfile.mkstemp(prefix=name + '_', suffix='_temp' + file_extension, dir=directory or '.')
+        try:
+            with open(fd, mode, encoding=None if 'b' in mode else 'utf-8') as f_new:
+                yield f_new
+            shutil.copymode(file_path, temp_file_path)
+            os.replace(temp_file_path, file_path)
+        except BaseException:
+            os.remove(temp_file_path)
+            raise
+
+    def source_paths(self):
+        """
+        The files the customers and products are read from, which a snapshot of them
+        depends on.
+        """
+        return [self.customer_file_path, self.product_file_path]
+
+    def snapshot_state(self):
+        """
+        State gathered while reading the files which has to be restored along with a
+        snapshot of the customers and products. See restore_snapshot_state.
+        """
+        return None
+
+    def restore_snapshot_state(self, state):
+        pass
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups writes which belong together, such as the customer, product and order
+        of one order. The CSV files cannot be rolled back, so here the writes are
+        simply made one after another.
+        """
+        yield
+
+    def write_product_to_file(self, product: Product, file):
+        file.write(self.format_product(product) + '\n')
+
+    def save_order(self, order: Order):
+        self.save_orders([order])
+
+    def save_orders(self, orders):
+        self.save_order_lines([self.format_order(order) for order in orders])
+
+    def save_order_lines(self, lines):
+        """Appends lines already in the order file format, such as from another order file."""
+        if self.orders_file_path is None:
+            return
+        if self.order_log is not None:
+            self.order_log.write(lines)
+            return
+        with self._file_locks[self.orders_file_path]:
+            with open(self.orders_file_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(lines))
+
+    def close(self):
+        if self.order_log is not None:
+            self.order_log.close()
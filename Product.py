@@ -1,9 +1,15 @@
+import sys
+
+
 class Product():
-    def __init__(self, id: str, name: str, price: float, stock: int) -> None:
-        self._id = id
-        self._name = name
-        self.price = price
+    __slots__ = ('_id', '_name', '_price', 'stock', '_bundles')
+
+    def __init__(self, id: str, name: str, price: int, stock: int) -> None:
+        self._id = sys.intern(id)
+        self._name = sys.intern(name)
+        self._price = price
         self.stock = stock
+        self._bundles = None
 
     def __iter__(self):
         i = [self.id, self.name, self.price, self.stock]
@@ -15,6 +21,19 @@ class Product():
     @property
     def name(self):
         return self._name
+    @property
+    def price(self):
+        return self._price
+    @price.setter
+    def price(self, price):
+        self._price = price
+        for bundle in self._bundles or ():
+            bundle.invalidate_price()
+
+    def add_bundle(self, bundle):
+        if self._bundles is None:
+            self._bundles = []
+        self._bundles.append(bundle)
         
     def __eq__(self, __o: object) -> bool:
-        return self._id == __o.id
\ No newline at end of file
+        return self._id == __o.id
@@ -0,0 +1,242 @@
+import builtins
+import contextlib
+import cProfile
+import inspect
+import os
+import pstats
+import sys
+import threading
+import time
+
+PROFILE_ENVIRONMENT_VARIABLE = 'CONSOLE_MART_PROFILE'
+PROFILE_ACTION_ENVIRONMENT_VARIABLE = 'CONSOLE_MART_PROFILE_ACTION'
+
+
+class Profiler():
+    """
+    Opt-in instrumentation which times the methods of the objects given to instrument()
+    and counts the bytes read and written through open() while they run.
+
+    Nothing is changed until an object is instrumented: its methods are then replaced
+    by timing wrappers on that instance only, so when profiling is off there is no
+    overhead at all. Times are inclusive, so a method calling other instrumented
+    methods also counts their time. Methods returning a generator or a context
+    manager are timed until the generator is exhausted or the context is left.
+
+    A menu action can additionally be run under cProfile, and its stats are dumped to
+    `stats_file_path` when the report is written.
+
+    Args:
+        profiled_action (str, optional): The number or title of the menu action to run
+            under cProfile
+        stats_file_path (str, optional): Where the cProfile stats are dumped
+        output (file, optional): Where the report is written
+    """
+
+    def __init__(self, profiled_action: str = None, stats_file_path: str = 'profile.pstats', output=sys.stderr) -> None:
+        self.profiled_action = profiled_action
+        self.stats_file_path = stats_file_path
+        self.output = output
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._patched_modules = []
+        self._cprofile = None
+
+    @classmethod
+    def from_options(cls, options):
+        """
+        Creates a Profiler if profiling was asked for with --profile or the
+        CONSOLE_MART_PROFILE environment variable, and returns None otherwise.
+        """
+        enabled = os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, '') not in ('', '0')
+        profiled_action = getattr(options, 'profile_action', None) or os.environ.get(PROFILE_ACTION_ENVIRONMENT_VARIABLE)
+        if not (getattr(options, 'profile', False) or enabled or profiled_action):
+            return None
+        return cls(profiled_action, getattr(options, 'profile_output', None) or 'profile.pstats')
+
+    def instrument(self, obj, label: str = None, private: bool = False):
+        """
+        Times every method of obj, only the public ones unless private is set. Modules
+        defining obj's classes have their open() replaced by one counting bytes.
+        """
+        label = label or type(obj).__name__
+        cls = type(obj)
+        for name in dir(cls):
+            if name.startswith('__') or (name.startswith('_') and not private):
+                continue
+            attribute = getattr(cls, name)
+            if not callable(attribute) or isinstance(attribute, type):
+                continue
+            setattr(obj, name, self._timed(f'{label}.{name}', getattr(obj, name)))
+        for klass in cls.__mro__:
+            self.count_io(sys.modules.get(klass.__module__))
+        return obj
+
+    def instrument_menu(self, menu):
+        """
+        Times the run() of every page of a Menu, running the chosen action under cProfile.
+        """
+        for number, (title, page) in enumerate(menu.menu_items, 1):
+            run = self._timed(f'{type(page).__name__}.run', page.run)
+            if self.profiled_action is not None and self.profiled_action.strip().lower() in (str(number), title.lower()):
+                run = self._cprofiled(run)
+            page.run = run
+
+    def count_io(self, module):
+        if module is None or module is builtins or module in self._patched_modules:
+            return
+        module.open = self._counting_open
+        self._patched_modules.append(module)
+
+    def restore(self):
+        """Puts back the open() of every module count_io() replaced it in."""
+        for module in self._patched_modules:
+            if module.__dict__.get('open') is self._counting_open:
+                del module.open
+        self._patched_modules = []
+
+    @contextlib.contextmanager
+    def timing(self, name: str):
+        """Times a block of code as if it were an instrumented method called name."""
+        counters = self._counters()
+        read, written = counters
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start, counters[0] - read, counters[1] - written)
+
+    def report(self):
+        rows = sorted(self._stats.items(), key=lambda item: item[1][1], reverse=True)
+        print(f'{"operation":<48} {"calls":>8} {"total ms":>10} {"mean us":>10} {"max us":>10} '
+              f'{"read B":>12} {"written B":>12}', file=self.output)
+        for name, (calls, total, longest, read, written) in rows:
+            mean = total / calls if calls else 0.
+            print(f'{name:<48} {calls:>8} {total * 1e3:>10.2f} {mean * 1e6:>10.1f} {longest * 1e6:>10.1f} '
+                  f'{read:>12} {written:>12}', file=self.output)
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(self.stats_file_path)
+            print(f'\ncProfile stats of {self.profiled_action!r} written to {self.stats_file_path}', file=self.output)
+            pstats.Stats(self._cprofile, stream=self.output).sort_stats('cumulative').print_stats(15)
+
+    def _counters(self):
+        counters = getattr(self._local, 'counters', None)
+        if counters is None:
+            counters = self._local.counters = [0, 0]
+        return counters
+
+    def _record(self, name: str, elapsed: float, read: int, written: int, calls: int = 1):
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = [0, 0., 0., 0, 0]
+            stats[0] += calls
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            stats[3] += read
+            stats[4] += written
+
+    def _timed(self, name: str, method):
+        def timed(*args, **kwargs):
+            counters = self._counters()
+            read, written = counters
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                self._record(name, time.perf_counter() - start, counters[0] - read, counters[1] - written)
+            if inspect.isgenerator(result):
+                return self._timed_generator(name, result)
+            if isinstance(result, contextlib.AbstractContextManager):
+                return self._timed_context(name, result)
+            return result
+
+        timed.__wrapped__ = method
+        return timed
+
+    def _timed_generator(self, name: str, generator):
+        counters = self._counters()
+        while True:
+            read, written = counters
+            start = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                return
+            finally:
+                self._record(name, time.perf_counter() - start, counters[0] - read, counters[1] - written, calls=0)
+            yield item
+
+    @contextlib.contextmanager
+    def _timed_context(self, name: str, context):
+        counters = self._counters()
+        read, written = counters
+        start = time.perf_counter()
+        try:
+            with context as value:
+                yield value
+        finally:
+            self._record(name, time.perf_counter() - start, counters[0] - read, counters[1] - written, calls=0)
+
+    def _cprofiled(self, run):
+        if self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+
+        def profiled(*args, **kwargs):
+            self._cprofile.enable()
+            try:
+                return run(*args, **kwargs)
+            finally:
+                self._cprofile.disable()
+
+        return profiled
+
+    def _counting_open(self, *args, **kwargs):
+        return _CountingFile(builtins.open(*args, **kwargs), self._counters())
+
+
+class _CountingFile():
+    """A file which adds the bytes read and written through it to a pair of counters."""
+
+    def __init__(self, file, counters) -> None:
+        self._file = file
+        self._counters = counters
+
+    def _count(self, data, index: int):
+        self._counters[index] += len(data.encode('utf-8')) if isinstance(data, str) else len(data)
+        return data
+
+    def read(self, *args):
+        return self._count(self._file.read(*args), 0)
+
+    def readline(self, *args):
+        return self._count(self._file.readline(*args), 0)
+
+    def readlines(self, *args):
+        lines = self._file.readlines(*args)
+        for line in lines:
+            self._count(line, 0)
+        return lines
+
+    def __iter__(self):
+        for line in self._file:
+            yield self._count(line, 0)
+
+    def write(self, data):
+        self._count(data, 1)
+        return self._file.write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def __enter__(self):
+        self._file.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._file.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
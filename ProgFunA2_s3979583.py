@@ -1,6 +1,9 @@
 import sys
 import datetime
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 
 
 class Customer:
@@ -20,11 +23,12 @@ class Customer:
 
     """
 
+    __slots__ = ("_id", "_name", "value")
     _discount_rate = 0.0
 
     def __init__(self, id: str, name: str, value: float = 0) -> None:
-        self._id = id
-        self._name = name
+        self._id = sys.intern(id)
+        self._name = sys.intern(name)
         self.value = value
 
     def __iter__(self):
@@ -63,10 +67,22 @@ class Customer:
         Returns:
             None
         """
-        attr = vars(self)
+        attr = self._attributes()
         attr["discount_rate"] = self.discount_rate
         print(f"Customer: {attr}")
 
+    def _attributes(self):
+        """
+        Collects the instance attributes of the customer, as stored in the
+        __slots__ of its class and base classes.
+        Args:
+            None
+        Returns:
+            dict of (str, object): The attribute names and their values
+        """
+        slots = [getattr(cls, "__slots__", ()) for cls in reversed(type(self).__mro__)]
+        return {name: getattr(self, name) for names in slots for name in names}
+
     def __eq__(self, __o: object) -> bool:
         return self._id == __o.id
 
@@ -88,6 +104,7 @@ class Member(Customer):
         discount_rate (float, static): The discount available to the member
     """
 
+    __slots__ = ()
     _discount_rate = 0.05
 
     def __init__(self, id: str, name: str, value: float = 0) -> None:
@@ -135,6 +152,7 @@ class VIPMember(Member):
         discount_threshold (float, static): The discount threshold for the VIP
     """
 
+    __slots__ = ("_discount_rate",)
     _discount_threshold = 1000.0
     _membership_cost = 200.0
 
@@ -152,7 +170,7 @@ class VIPMember(Member):
         Returns:
             None
         """
-        attr = vars(self)
+        attr = self._attributes()
         attr["discount_rate"] = self.discount_rate
         attr["discount_threshold"] = self._discount_threshold
         print(f"Customer: {attr}")
@@ -217,9 +235,11 @@ class Product:
         stock (int): The amount of product in stock
     """
 
+    __slots__ = ("_id", "_name", "price", "stock")
+
     def __init__(self, id: str, name: str, price: float, stock: int) -> None:
-        self._id = id
-        self._name = name
+        self._id = sys.intern(id)
+        self._name = sys.intern(name)
         self.price = price
         self.stock = stock
 
@@ -248,25 +268,28 @@ class Bundle:
     Args:
         id (str): The unique string of the product
         name (str): The unique name of the product
-        price (float): The price of the product
+        products (iterable of (str, float)): The (id, price) of each product in the bundle
         stock (int): The amount of product in stock
         discount (float, optional): The discount to apply to the bundle
 
     Attributes:
         id (str): The unique string of the product
         name (str): The unique name of the product
+        products (tuple of (str, float)): The (id, price) of each product in the bundle
         price (float): The price of the product
         stock (int): The amount of product in stock
         discount (float): The discount to apply to the bundle
 
     """
 
+    __slots__ = ("_id", "_name", "products", "stock", "discount")
+
     def __init__(
         self, id: str, name: str, products, stock: int, discount: float = 0.2
     ) -> None:
-        self._id = id
-        self._name = name
-        self.products = products
+        self._id = sys.intern(id)
+        self._name = sys.intern(name)
+        self.products = tuple(products)
         self.stock = stock
         self.discount = discount
 
@@ -294,7 +317,7 @@ class Bundle:
         Returns:
             None
         """
-        prices = list(map(lambda x: x["price"], self.products))
+        prices = [price for _, price in self.products]
         if None in prices:
             return None
         return sum(prices) * (1 - self.discount)
@@ -323,6 +346,8 @@ class Order:
 
     """
 
+    __slots__ = ("customer", "product", "quantity", "purchased_VIP", "timestamp")
+
     def __init__(
         self,
         customer: str,
@@ -441,14 +466,47 @@ class PersistentStorageManager:
         Returns:
             list of Bundle: The list of Bundles from persistent storage
         """
-        products = self.csv_reader(self.product_file_path)
+        products = {p.id: p for p in product_list}
+        bundles = self.csv_reader(self.product_file_path)
         bundle_list = [
-            self.__create_bundle(product_list, args)
-            for args in products
+            self.__create_bundle(products, args)
+            for args in bundles
             if args[0][0] == "B"
         ]
         return bundle_list
 
+    def read_catalog(self):
+        """
+        Reads the products and bundles from persistent storage in a single pass.
+        Products are collected in an id map as they are read, which the bundles are
+        resolved against. Bundles listed before one of their products are deferred
+        until the whole file has been read.
+
+        Args:
+            None
+        Returns:
+            list of Product|Bundle: The products followed by the bundles, in file order
+        """
+        products = {}
+        product_list = []
+        bundle_list = []
+        deferred = []
+        for args in self.csv_reader(self.product_file_path):
+            if args[0][0] == "P":
+                product = self.__create_product(*args)
+                products.setdefault(product.id, product)
+                product_list.append(product)
+            elif args[0][0] == "B":
+                if all(product_id in products for product_id in args[2:-1]):
+                    bundle_list.append(self.__create_bundle(products, args))
+                else:
+                    deferred.append((len(bundle_list), args))
+                    bundle_list.append(None)
+
+        for index, args in deferred:
+            bundle_list[index] = self.__create_bundle(products, args)
+        return product_list + bundle_list
+
     def __create_product(self, id: str, name: str, price: str, stock: str):
         """
         Deserializes the product, represented as strings, into a
@@ -468,23 +526,21 @@ class PersistentStorageManager:
         stock = int(stock)
         return Product(id, name, price, stock)
 
-    def __create_bundle(self, product_list, args):
+    def __create_bundle(self, products, args):
         """
         Deserializes the bundle, represented as strings, into a
         Bundle instance. Uses an args list to represent the necessary information.
         The list should be of the format: [id, name, product_id_1, ..., product_id_n, stock]
         Args:
-            product_list (list of Product): Products used to create bundle
+            products (dict of str, Product): Products used to create bundle, by id
             args (list of str): Arguments used to create bundle
         Returns:
             bundle (Bundle): The bundle instance
         """
         id = args[0]
         name = args[1]
-        bundle = args[2:-1]
-        products = [
-            {"id": p.id, "price": p.price} for p in product_list if p.id in bundle
-        ]
+        products = [products[product_id] for product_id in args[2:-1]]
+        products = [(p.id, p.price) for p in products]
         stock = int(args[-1])
         return Bundle(id, name, products, stock)
 
@@ -501,6 +557,7 @@ class PersistentStorageManager:
             for line in f:
                 args = line.split(", ")
                 customer, product, quantity, timestamp = args
+                customer, product = sys.intern(customer), sys.intern(product)
                 orders.append(Order(customer, product, quantity, timestamp=timestamp))
         return orders
 
@@ -556,19 +613,15 @@ class PersistentStorageManager:
         Returns:
             None
         """
-        temp_file_path, file_extension = os.path.splitext(self.customer_file_path)
-        temp_file_path += "_temp" + file_extension
-        with open(self.customer_file_path, "r+", encoding="utf-8") as f:
-            with open(temp_file_path, "w", encoding="utf-8") as f_new:
+        with open(self.customer_file_path, "r", encoding="utf-8") as f:
+            with self.__replacing(self.customer_file_path) as f_new:
                 for line in f:
-                    if line.startswith(customer.id):
+                    if line.startswith(customer.id + ","):
                         id, name, discount_rate, value = customer
                         f_new.write(f"{id}, {name}, {discount_rate}, {value}\n")
                     else:
                         f_new.write(line)
 
-        os.replace(temp_file_path, self.customer_file_path)
-
     def update_product_info(self, product: Product):
         """
         Updates product info in persistent storage. Relevant for updating price or
@@ -584,17 +637,39 @@ class PersistentStorageManager:
         Returns:
             None
         """
-        temp_file_path, file_extension = os.path.splitext(self.product_file_path)
-        temp_file_path += "_temp" + file_extension
-        with open(self.product_file_path, "r+", encoding="utf-8") as f:
-            with open(temp_file_path, "w", encoding="utf-8") as f_new:
+        with open(self.product_file_path, "r", encoding="utf-8") as f:
+            with self.__replacing(self.product_file_path) as f_new:
                 for line in f:
-                    if line.startswith(product.id):
+                    if line.startswith(product.id + ","):
                         self.write_product_to_file(product, f_new)
                     else:
                         f_new.write(line)
 
-        os.replace(temp_file_path, self.product_file_path)
+    @contextmanager
+    def __replacing(self, file_path: str):
+        """
+        Opens a uniquely named temporary file next to file_path, which replaces
+        file_path once it has been written. Two writers never share a temporary
+        file, and a failed write leaves file_path untouched.
+
+        Args:
+            file_path (str): The file to replace
+        Returns:
+            file: The temporary file to write the new contents to
+        """
+        directory, file_name = os.path.split(file_path)
+        name, file_extension = os.path.splitext(file_name)
+        fd, temp_file_path = tempfile.mkstemp(
+            prefix=name + "_", suffix="_temp" + file_extension, dir=directory or "."
+        )
+        try:
+            with open(fd, "w", encoding="utf-8") as f_new:
+                yield f_new
+            shutil.copymode(file_path, temp_file_path)
+            os.replace(temp_file_path, file_path)
+        except BaseException:
+            os.remove(temp_file_path)
+            raise
 
     def write_product_to_file(self, product: Product, file):
         """
@@ -613,7 +688,7 @@ class PersistentStorageManager:
             file.write(f"{id}, {name}, {price}, {stock}\n")
         elif product.id.startswith("B"):
             id, name, products, stock = product
-            product_ids = [p["id"] for p in products]
+            product_ids = [product_id for product_id, _ in products]
             products = ", ".join(product_ids)
             file.write(f"{id}, {name}, {products}, {stock}\n")
 
@@ -659,12 +734,19 @@ class Records:
         self._storage_manager = PersistentStorageManager(
             customer_file_path, product_file_path, orders_file_path
         )
+        self._customers_by_id = {}
+        self._customers_by_name = {}
+        self._products_by_id = {}
+        self._products_by_name = {}
         try:
             self.customers = self._storage_manager.read_customers()
-            self.products = self._storage_manager.read_products()
-            self.products += self._storage_manager.read_bundles(self.products)
+            self.products = self._storage_manager.read_catalog()
         except Exception as e:
             raise IOError(e) from e
+        for customer in self.customers:
+            self._index_customer(customer)
+        for product in self.products:
+            self._index_product(product)
         try:
             self.orders = self._storage_manager.read_orders()
         except Exception:
@@ -685,14 +767,13 @@ class Records:
         Returns:
             Customer|None: The customer found. If none found, return None.
         """
+        indexes = (self._customers_by_name, self._customers_by_id)
         if search_in_name is not None:
-            return self.find_in_customers_or_products(
-                query, search_in_name, self.customers
-            )
+            return self.find_in_customers_or_products(query, search_in_name, indexes)
 
-        customer = self.find_in_customers_or_products(query, True, self.customers)
+        customer = self.find_in_customers_or_products(query, True, indexes)
         if customer is None:
-            customer = self.find_in_customers_or_products(query, False, self.customers)
+            customer = self.find_in_customers_or_products(query, False, indexes)
         return customer
 
     def find_product(self, query: str, search_in_name: bool = False):
@@ -706,33 +787,57 @@ class Records:
         Returns:
             Customer|None: The product found. If none found, return None.
         """
+        indexes = (self._products_by_name, self._products_by_id)
         if search_in_name is not None:
-            return self.find_in_customers_or_products(
-                query, search_in_name, self.products
-            )
+            return self.find_in_customers_or_products(query, search_in_name, indexes)
 
-        product = self.find_in_customers_or_products(query, True, self.products)
+        product = self.find_in_customers_or_products(query, True, indexes)
         if product is None:
-            product = self.find_in_customers_or_products(query, False, self.products)
+            product = self.find_in_customers_or_products(query, False, indexes)
         return product
 
-    def find_in_customers_or_products(self, query: str, search_in_name: bool, arr_list):
+    def find_in_customers_or_products(self, query: str, search_in_name: bool, indexes):
         """
-        Searches for a customer/product in a given list by either name or id.
+        Looks up a customer/product by either name or id in a pair of indexes.
+        Names may be shared, so the name index maps to a list of instances and
+        the first one registered is returned.
 
         Args:
             query (str): The id/name to seach for
             search_in_name (bool): Whether to seach in name
-            arr_lst (list of Product / List of Customer): The list to search in
+            indexes (tuple of dict, dict): The (name index, id index) to search in
         Returns:
             Customer|Product|None: The instance found. If none found, return None.
         """
-        field = (lambda x: x.name) if search_in_name else (lambda x: x.id)
-        try:
-            index = list(map(field, arr_list)).index(query)
-            return arr_list[index]
-        except ValueError:
-            return None
+        by_name, by_id = indexes
+        if search_in_name:
+            matches = by_name.get(query)
+            return matches[0] if matches else None
+        return by_id.get(query)
+
+    def _index_customer(self, customer: Customer):
+        """
+        Registers a customer in the id and name indexes.
+
+        Args:
+            customer (Customer): The customer to index
+        Returns:
+            None
+        """
+        self._customers_by_id.setdefault(customer.id, customer)
+        self._customers_by_name.setdefault(customer.name, []).append(customer)
+
+    def _index_product(self, product: Product):
+        """
+        Registers a product/bundle in the id and name indexes.
+
+        Args:
+            product (Product|Bundle): The product to index
+        Returns:
+            None
+        """
+        self._products_by_id.setdefault(product.id, product)
+        self._products_by_name.setdefault(product.name, []).append(product)
 
     def list_customers(self):
         """
@@ -769,7 +874,7 @@ class Records:
                     )
                 )
             elif product.id.startswith("B"):
-                product_ids = [p["id"] for p in product.products]
+                product_ids = [product_id for product_id, _ in product.products]
                 product_ids = ", ".join(product_ids)
                 print(
                     "{}, {}, {}, {:.2f}, {}".format(
@@ -829,6 +934,7 @@ class Records:
         self.next_customer_id += 1
         self._storage_manager.save_customer(customer)
         self.customers.append(customer)
+        self._index_customer(customer)
         return customer
 
     def execute_order(self, order: Order):
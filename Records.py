@@ -1,25 +1,83 @@
 import os
-from Bundle import Bundle
+import threading
+from contextlib import contextmanager
+from ColumnarCustomerStore import ColumnarCustomerStore
 from Customer import Customer
+from Listing import Listing
+from LockTable import LockTable
 from Member import Member
+from Money import format_money, to_dollars
+from NameIndex import NameIndex
 from Order import Order
+from OrderClock import EARLIEST, LATEST, format_timestamp, parse_timestamp
+from PersistentStorageManager import PersistentStorageManager
 from Product import Product
+from SalesAnalytics import SalesAnalytics
+from SnapshotCache import SnapshotCache
 from VIPMember import VIPMember
 
+CUSTOMER_COLUMNS = ('id', 'name', 'discount_rate', 'value')
+PRODUCT_COLUMNS = ('id', 'name', 'price', 'stock', 'products')
+ORDER_COLUMNS = ('customer', 'product', 'quantity', 'timestamp')
+
+
+class NewCustomer():
+    """
+    Stands in for the customer of an order placed by someone who is not signed up yet.
+    execute_orders() signs them up with the first of their orders it accepts, which
+    pays the membership of a VIP, so a rejected order leaves no customer behind.
+
+    Args:
+        name (str): The name to sign up with
+        member_type (str, optional): C, M or V
+        number (int, optional): The number of the customer id, if already given out
+
+    Attributes:
+        customer (Customer): The customer once signed up, otherwise None
+    """
+    __slots__ = ('name', 'member_type', 'number', 'customer')
+
+    def __init__(self, name: str, member_type: str = 'C', number: int = None) -> None:
+        self.name = name
+        self.member_type = member_type
+        self.number = number
+        self.customer = None
+
 
 class Records():
-    def __init__(self, customer_file_path: str, product_file_path: str, orders_file_path: str = None) -> None:
+    def __init__(self, customer_file_path: str, product_file_path: str, orders_file_path: str = None, storage_manager: PersistentStorageManager = None, columnar: bool = False, save_order_index: bool = False, snapshot: bool = True) -> None:
+        if storage_manager is None:
+            storage_manager = PersistentStorageManager(customer_file_path, product_file_path, orders_file_path)
+        self._storage_manager = storage_manager
         self.customer_file_path = customer_file_path
         self.product_file_path = product_file_path
         self.orders_file_path = orders_file_path
+        self.save_order_index = save_order_index
+        self._customers_by_id = {}
+        self._customers_by_name = {}
+        self._products_by_id = {}
+        self._products_by_name = {}
+        self._customer_name_index = None
+        self._product_name_index = None
+        self._analytics = None
+        self._customer_locks = LockTable()
+        self._product_locks = LockTable()
+        self._records_lock = threading.RLock()
+        self._snapshot = None
+        if snapshot:
+            snapshot_file_path = os.path.splitext(customer_file_path)[0] + '.snapshot'
+            self._snapshot = SnapshotCache(snapshot_file_path, storage_manager.source_paths())
         try:
-            self.customers = self.read_customers()
-            self.products = None
-            self.read_products()
+            self._load()
         except Exception as e:
             raise IOError(e) from e
+        if columnar:
+            self.customers = ColumnarCustomerStore(self.customers)
+            self._customers_by_id, self._customers_by_name = {}, {}
+            for customer in self.customers:
+                self._index_customer(customer)
         try:
-            self.orders = self.read_orders()
+            self.orders = self._storage_manager.read_orders()
         except Exception:
             print('Cannot load the order file. Run as if there is no order previously.')
             self.orders = []
@@ -27,110 +85,174 @@ class Records():
         self.next_customer_id = self.get_last_customer_id() + 1
         self.next_product_id = self.get_last_product_id() + 1
 
-    def read_customers(self):
-        customers = self.csv_reader(self.customer_file_path)
-        create_customer = lambda args: self.__create_customer(*args)
-        return list(map(create_customer, customers))
-    
-    def __create_customer(self, id: str, name: str, discount_rate: str, value: str):
-        customer_type = id[0]
-        discount_rate = float(discount_rate)
-        value = float(value)
-        if customer_type == 'C':
-            return Customer(id, name, value)
-        elif customer_type == 'M':
-            return Member(id, name, value)
-        elif customer_type == 'V':
-            return VIPMember(id, name, value, discount_rate)
-
-
-    def read_products(self):
-        products = self.csv_reader(self.product_file_path)
-        product_list = [self.__create_product(*args) for args in products if args[0][0] == 'P']
-        self.products = product_list
-
-        products = self.csv_reader(self.product_file_path)
-        bundle_list = [self.__create_bundle(args) for args in products if args[0][0] == 'B']
-        self.products += bundle_list
-        
+    def _load(self):
+        # The snapshot holds the indexes as well, as building them takes about as
+        # long as loading the customers themselves
+        fingerprint = None
+        if self._snapshot is not None:
+            fingerprint = self._snapshot.fingerprint()
+            state = self._snapshot.load(fingerprint)
+            if state is not None:
+                (self.customers, self.products, self._customers_by_id, self._customers_by_name,
+                 self._products_by_id, self._products_by_name, storage_state) = state
+                self._storage_manager.restore_snapshot_state(storage_state)
+                return
 
-    def __create_product(self, id: str, name: str, price: str, quantity: str):
-        if not price.strip() == '':
-            price = float(price)
-        else:
-            price = None
-        quantity = int(quantity)
-        return Product(id, name, price, quantity)
-
-    def __create_bundle(self, args):
-        id = args[0]
-        name = args[1]
-        products = list(map(self.find_product, args[2:-1]))
-        products = [{'id': p.id, 'price': p.price} for p in products]
-        stock = int(args[-1])
-        return Bundle(id, name, products, stock)
-
-    def read_orders(self):
-        orders = []
-        with open(self.orders_file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                args = line.split(', ')
-                customer, product, quantity, timestamp = args
-                orders.append(Order(customer, product, quantity, timestamp=timestamp))
-        return orders
-
-    def csv_reader(self, file_name):
-        try:
-            with open(file_name, 'r', encoding='utf-8') as f:
-                for line in f:
-                    yield line.split(', ')
-        except FileNotFoundError as e:
-            print('Customer data file not found. Exiting...')
-            raise e
+        self.customers = self._storage_manager.read_customers()
+        self.products = self._storage_manager.read_catalog()
+        for customer in self.customers:
+            self._index_customer(customer)
+        for product in self.products:
+            self._index_product(product)
+        # Only state parsed from the files is snapshot. The records may later hold
+        # changes which were never written, so they are not snapshot on close, and
+        # the first start after files changed parses them again instead
+        if self._snapshot is not None:
+            state = (list(self.customers), self.products, self._customers_by_id, self._customers_by_name,
+                     self._products_by_id, self._products_by_name, self._storage_manager.snapshot_state())
+            self._snapshot.save(state, fingerprint)
 
-    
     def find_customer(self, query: str, search_in_name: bool = None):
+        indexes = (self._customers_by_name, self._customers_by_id)
         if search_in_name is not None:
-            return self.find_in_customers_or_products(query, search_in_name, self.customers)
+            return self.find_in_customers_or_products(query, search_in_name, indexes)
 
-        customer = self.find_in_customers_or_products(query, True, self.customers)
+        customer = self.find_in_customers_or_products(query, True, indexes)
         if customer is None:
-            customer = self.find_in_customers_or_products(query, False, self.customers)
+            customer = self.find_in_customers_or_products(query, False, indexes)
         return customer
 
     def find_product(self, query: str, search_in_name: bool = False):
+        indexes = (self._products_by_name, self._products_by_id)
         if search_in_name is not None:
-            return self.find_in_customers_or_products(query, search_in_name, self.products)
+            return self.find_in_customers_or_products(query, search_in_name, indexes)
 
-        product = self.find_in_customers_or_products(query, True, self.products)
+        product = self.find_in_customers_or_products(query, True, indexes)
         if product is None:
-            product = self.find_in_customers_or_products(query, False, self.products)
+            product = self.find_in_customers_or_products(query, False, indexes)
         return product
 
-    def find_in_customers_or_products(self, query: str, search_in_name: bool, arr_list):
-        field = (lambda x: x.name) if search_in_name else (lambda x: x.id)
-        try:
-            index = list(map(field, arr_list)).index(query)
-            return arr_list[index]
-        except ValueError:
-            return None
+    def find_in_customers_or_products(self, query: str, search_in_name: bool, indexes):
+        by_name, by_id = indexes
+        if search_in_name:
+            matches = by_name.get(query)
+            return matches[0] if matches else None
+        return by_id.get(query)
 
-    def list_customers(self, format_string='{0}, {1}, {2}, {3}'):
-        print('CUSTOMERS: ')
-        for customer in self.customers:
-            print(format_string.format(customer.id, customer.name, customer.discount_rate, customer.value))
+    def search_customers(self, query: str, limit: int = 10):
+        """Suggests customers whose name starts with or resembles query."""
+        with self._records_lock:
+            if self._customer_name_index is None:
+                self._customer_name_index = NameIndex(self.customers)
+            return self._customer_name_index.search(query, limit)
 
-    def list_products(self, format_string='{0}, {1}, {2}, {3}'):
-        print('PRODUCTS: ')
-        for product in self.products:
-            if product.id.startswith('P'):
-                print(format_string.format(product.id, product.name, product.price, product.stock))
-            elif product.id.startswith('B'):
-                product_ids = [p['id'] for p in product.products]
-                product_ids = ', '.join(product_ids)
-                print(format_string.format(product.id, product.name, product_ids, product.stock))
-                
+    def search_products(self, query: str, limit: int = 10):
+        """Suggests products and bundles whose name starts with or resembles query."""
+        with self._records_lock:
+            if self._product_name_index is None:
+                self._product_name_index = NameIndex(self.products)
+            return self._product_name_index.search(query, limit)
+
+    def _index_customer(self, customer: Customer):
+        self._customers_by_id.setdefault(customer.id, customer)
+        self._customers_by_name.setdefault(customer.name, []).append(customer)
+        # The name indexes are only built by the first search, then kept up to date
+        if self._customer_name_index is not None:
+            self._customer_name_index.add(customer)
+
+    def _index_product(self, product):
+        self._products_by_id.setdefault(product.id, product)
+        self._products_by_name.setdefault(product.name, []).append(product)
+        if self._product_name_index is not None:
+            self._product_name_index.add(product)
+
+    def list_customers(self, format_string='{0}, {1}, {2}, {3}', listing: Listing = None):
+        def text(row):
+            customer_id, name, discount_rate, value = row
+            return format_string.format(customer_id, name, discount_rate, format_money(value))
+
+        # Rows keep amounts in cents, which are written in dollars
+        values = lambda row: row[:3] + (to_dollars(row[3]),)
+        rows = ((customer.id, customer.name, customer.discount_rate, customer.value) for customer in self.customers)
+        return (listing or Listing()).render('CUSTOMERS: ', CUSTOMER_COLUMNS, rows, text, values)
+
+    def list_products(self, format_string='{0}, {1}, {2}, {3}', listing: Listing = None):
+        def text(row):
+            # Bundles show the products they are made of in place of their price
+            product_id, name, price, stock, product_ids = row
+            if product_ids:
+                price = ', '.join(product_ids)
+            elif price is not None:
+                price = format_money(price)
+            return format_string.format(product_id, name, price, stock)
+
+        values = lambda row: row[:2] + (to_dollars(row[2]),) + row[3:]
+        rows = ((product.id, product.name, product.price, product.stock,
+                 tuple(p.id for p in product.products) if product.id.startswith('B') else ())
+                for product in self.products)
+        return (listing or Listing()).render('PRODUCTS: ', PRODUCT_COLUMNS, rows, text, values)
+
+    def list_orders(self, customer_id: str = None, listing: Listing = None, start=None, end=None):
+        id_of = lambda record: getattr(record, 'id', record)
+        if start is None and end is None:
+            orders = self.orders if customer_id is None else self.orders_of_customer(customer_id)
+        else:
+            orders = self.orders_between(start, end)
+            if customer_id is not None:
+                orders = (order for order in orders if id_of(order.customer) == customer_id)
+        rows = ((id_of(customer), id_of(product), int(quantity), format_timestamp(timestamp))
+                for customer, product, quantity, _, timestamp in orders)
+        return (listing or Listing()).render('ORDERS:', ORDER_COLUMNS, rows)
 
+    def orders_between(self, start=None, end=None):
+        """
+        The orders placed from start up to but not including end, oldest first. Times
+        can be given as datetimes, ISO 8601 strings or microseconds since the epoch, and
+        leaving one out leaves the range open on that side.
+        """
+        start = EARLIEST if start is None else parse_timestamp(start)
+        end = LATEST if end is None else parse_timestamp(end)
+        if hasattr(self.orders, 'orders_between'):
+            return self.orders.orders_between(start, end)
+        return sorted((order for order in self.orders if start <= order.timestamp < end),
+                      key=lambda order: order.timestamp)
+
+    def orders_of_customer(self, customer_id: str):
+        # Read as a whole under the records lock, as orders are appended to the same
+        # history while it is read
+        with self._records_lock:
+            if hasattr(self.orders, 'orders_of_customer'):
+                return list(self.orders.orders_of_customer(customer_id))
+            customer_of = lambda order: getattr(order.customer, 'id', order.customer)
+            return [order for order in self.orders if customer_of(order) == customer_id]
+
+    def sales_analytics(self):
+        """
+        The running sales totals, backfilled from the order history on first use and
+        kept up to date by every order placed after that.
+        """
+        with self._records_lock:
+            if self._analytics is None:
+                analytics = SalesAnalytics()
+                analytics.backfill(self.orders, lambda id: self.find_customer(id, False),
+                                   lambda id: self.find_product(id, False))
+                self._analytics = analytics
+            return self._analytics
+
+    def total_value_by_type(self):
+        if isinstance(self.customers, ColumnarCustomerStore):
+            return self.customers.total_value_by_type()
+        totals = dict.fromkeys('CMV', 0)
+        for customer in self.customers:
+            totals[customer.id[0]] += customer.value
+        return totals
+
+    def customers_above_threshold(self, threshold: int = None):
+        if isinstance(self.customers, ColumnarCustomerStore):
+            return self.customers.customers_above(threshold)
+        if threshold is None:
+            threshold = VIPMember._discount_threshold
+        return [customer for customer in self.customers if customer.value > threshold]
 
     def get_last_customer_id(self):
         if len(self.customers) == 0:
@@ -142,80 +264,154 @@ class Records():
             return 0
         return int(self.products[-1].id[1:])
 
-    def __save_customer(self, customer: Customer):
-        try:
-            with open(self.customer_file_path, 'a', encoding='utf-8') as f:
-                f.write(f'{customer.id}, {customer.name}, {customer.discount_rate}, {customer.value}\n')
-        except IOError as e:
-            print('Error saving customer to file. Exitting...')
-            raise e
-        self.customers.append(customer)
-
     def create_new_customer(self, name: str, member_type: str = 'C'):
-        if member_type == 'C':
-            customer = Customer(member_type+str(self.next_customer_id), name)
-        elif member_type == 'M':
-            customer = Member(member_type+str(self.next_customer_id), name)
-        elif member_type == 'V':
-            customer = VIPMember(member_type+str(self.next_customer_id), name)
-        self.next_customer_id += 1;
-        self.__save_customer(customer)
+        with self._records_lock:
+            return self._add_customer(self._new_customer(NewCustomer(name, member_type)))
+
+    def _new_customer(self, sign_up: NewCustomer):
+        # Gives the customer an id, without adding them to the records yet
+        with self._records_lock:
+            number = self.next_customer_id if sign_up.number is None else sign_up.number
+            customer_id = sign_up.member_type + str(number)
+            if sign_up.member_type == 'C':
+                customer = Customer(customer_id, sign_up.name)
+            elif sign_up.member_type == 'M':
+                customer = Member(customer_id, sign_up.name)
+            elif sign_up.member_type == 'V':
+                customer = VIPMember(customer_id, sign_up.name)
+            self.next_customer_id = max(self.next_customer_id, number + 1)
+        return customer
+
+    def _add_customer(self, customer: Customer):
+        self._storage_manager.save_customer(customer)
+        self.customers.append(customer)
+        customer = self.customers[-1]
+        self._index_customer(customer)
         return customer
 
 
     def execute_order(self, order: Order):
+        with self._locking([order]):
+            reason = self._reject_reason(order)
+            if reason is not None:
+                raise ValueError(reason)
+            self._apply_order(order)
+
+            # The records lock is taken before the storage transaction, the same order
+            # as create_new_customer, so the two cannot deadlock.
+            with self._records_lock, self._storage_manager.transaction():
+                self._storage_manager.update_customer_info(order.customer)
+                self._storage_manager.update_product_info(order.product)
+                self._storage_manager.save_order(order)
+                self.orders.append(order)
+                if self._analytics is not None:
+                    self._analytics.record(order)
+
+    def execute_orders(self, orders, stock_reserved: bool = False):
+        # With stock_reserved the stock has already been taken by whoever owns the
+        # products (see ShardedRecords), so only the customers are charged.
+        # The customer of an order may be a NewCustomer, who is signed up by it.
+        orders = list(orders)
+        for order in orders:
+            if isinstance(order.customer, NewCustomer) and order.customer.customer is not None:
+                order.customer = order.customer.customer
+        results = []
+        customers = {}
+        products = {}
+        sign_ups = {}
+        executed = []
+        with self._locking(orders):
+            for order in orders:
+                product = order.product
+                reason = self._reject_reason(order, stock_reserved)
+                if reason is not None:
+                    results.append((False, reason))
+                    continue
+                if isinstance(order.customer, NewCustomer):
+                    sign_up = order.customer
+                    # Nobody else can find the customer before they are added below,
+                    # so they are not locked
+                    order.purchased_VIP = sign_up.customer is None and sign_up.member_type == 'V'
+                    if sign_up.customer is None:
+                        sign_up.customer = self._new_customer(sign_up)
+                        sign_ups[sign_up.customer.id] = sign_up
+                    order.customer = sign_up.customer
+                self._apply_order(order, stock_reserved)
+                if order.customer.id not in sign_ups:
+                    customers[order.customer.id] = order.customer
+                if not stock_reserved:
+                    products[product.id] = product
+                executed.append(order)
+                results.append((True, None))
+
+            if executed:
+                try:
+                    self._save_executed(executed, customers, products, sign_ups)
+                except BaseException:
+                    # Customers who were not added are signed up by a later order instead
+                    for sign_up in sign_ups.values():
+                        if self.find_customer(sign_up.customer.id, False) is None:
+                            sign_up.customer = None
+                    raise
+        return results
+
+    def _save_executed(self, executed, customers, products, sign_ups):
+        with self._records_lock, self._storage_manager.transaction():
+            for sign_up in sign_ups.values():
+                # Customers kept in columns are replaced by a view of their row
+                sign_up.customer = self._add_customer(sign_up.customer)
+            for order in executed:
+                if order.customer.id in sign_ups:
+                    order.customer = sign_ups[order.customer.id].customer
+            if customers:
+                self._storage_manager.update_customers_info(customers.values())
+            if products:
+                self._storage_manager.update_products_info(products.values())
+            self._storage_manager.save_orders(executed)
+            self.orders.extend(executed)
+            if self._analytics is not None:
+                self._analytics.record_all(executed)
+
+    @contextmanager
+    def _locking(self, orders):
+        # Customers are always locked before products, and each table locks in
+        # sorted id order, so concurrent orders cannot deadlock.
+        customer_ids = (order.customer.id for order in orders if not isinstance(order.customer, NewCustomer))
+        with self._customer_locks.holding(customer_ids):
+            with self._product_locks.holding(order.product.id for order in orders):
+                yield
+
+    @staticmethod
+    def _reject_reason(order: Order, stock_reserved: bool = False):
+        product, quantity = order.product, order.quantity
+        if quantity < 1:
+            return f'{quantity} is an invalid amount'
+        if product.price is None or product.price <= 0:
+            return f'{product.id} has an invalid pricing of {format_money(product.price)}'
+        if not stock_reserved and quantity > product.stock:
+            return f'{quantity} exceeds the {product.stock} {product.name}(s) in stock'
+        return None
+
+    def _apply_order(self, order: Order, stock_reserved: bool = False):
         customer, product, quantity, purchased_VIP, _ = order
         customer.value += customer.get_discount(order.total_price)[1]
         if purchased_VIP:
             customer.value += VIPMember.membership_cost
         
-        product.stock -= quantity
-
-        self.update_customer_info(customer)
-        self.update_product_info(product)
-        self.append_order(order)
+        if not stock_reserved:
+            product.stock -= quantity
     
     def update_customer_info(self, customer: Customer):
-        temp_file_path, file_extension = os.path.splitext(self.customer_file_path)
-        temp_file_path += '_temp' + file_extension
-        with open(self.customer_file_path, 'r+', encoding='utf-8') as f:
-            with open(temp_file_path, 'w', encoding='utf-8') as f_new:
-                for line in f:
-                    if line.startswith(customer.id):
-                        id, name, discount_rate, value = customer
-                        f_new.write(f'{id}, {name}, {discount_rate}, {value}\n')
-                    else:
-                        f_new.write(line)
-
-        os.replace(temp_file_path, self.customer_file_path)
+        with self._customer_locks[customer.id]:
+            self._storage_manager.update_customer_info(customer)
 
-    
     def update_product_info(self, product: Product):
-        temp_file_path, file_extension = os.path.splitext(self.product_file_path)
-        temp_file_path += '_temp' + file_extension
-        with open(self.product_file_path, 'r+', encoding='utf-8') as f:
-            with open(temp_file_path, 'w', encoding='utf-8') as f_new:
-                for line in f:
-                    if line.startswith(product.id):
-                        self.write_product_to_file(product, f_new)
-                    else:
-                        f_new.write(line)
-        
-        os.replace(temp_file_path, self.product_file_path)
+        with self._product_locks[product.id]:
+            self._storage_manager.update_product_info(product)
 
-    
-    def write_product_to_file(self, product: Product, file):
-        if product.id.startswith('P'):
-            id, name, price, stock = product
-            file.write(f'{id}, {name}, {price}, {stock}\n')
-        elif product.id.startswith('B'):
-            id, name, products, stock = product
-            product_ids = [p['id'] for p in products]
-            products = ', '.join(product_ids)
-            file.write(f'{id}, {name}, {products}, {stock}\n')
-
-    def append_order(self, order: Order):
-        if self.orders_file_path is None:
-            return
-        with open(self.orders_file_path, 'a', encoding='utf-8') as f:
-            f.write(f'{order.customer.id}, {order.product.id}, {order.quantity}, {order.timestamp}\n')
+    def close(self):
+        if self.save_order_index and hasattr(self.orders, 'save_index'):
+            self.orders.save_index()
+        if hasattr(self.orders, 'close'):
+            self.orders.close()
+        self._storage_manager.close()
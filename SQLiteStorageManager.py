@@ -0,0 +1,289 @@
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from Customer import Customer
+from Money import SCALE, format_money, to_cents
+from Order import Order
+from OrderClock import parse_timestamp
+from PersistentStorageManager import PersistentStorageManager
+
+# Timestamps are microseconds since the epoch
+ORDERS_TABLE = '''
+CREATE TABLE IF NOT EXISTS orders (
+    customer_id TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL
+)'''
+
+ORDER_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS orders_customer ON orders (customer_id, timestamp)',
+    'CREATE INDEX IF NOT EXISTS orders_timestamp ON orders (timestamp)',
+)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS customers (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    discount_rate REAL NOT NULL,
+    value INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS customers_name ON customers (name);
+
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    price INTEGER,
+    stock INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_name ON products (name);
+
+CREATE TABLE IF NOT EXISTS bundle_products (
+    bundle_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    PRIMARY KEY (bundle_id, position)
+);
+''' + ''.join(statement + ';\n' for statement in (ORDERS_TABLE, *ORDER_INDEXES))
+
+
+class SQLiteStorageManager(PersistentStorageManager):
+    """
+    A PersistentStorageManager which keeps customers, products and orders in an SQLite
+    database instead of the CSV files. Updates touch single indexed rows instead of
+    rewriting files, and the database runs in WAL mode so reads are not blocked by writes.
+
+    The database rows are read back in the same shape as the CSV lines, so every
+    reader of PersistentStorageManager works unchanged. Writes made inside transaction()
+    are committed together, or not at all.
+
+    A new database is filled from the CSV files on first use. import_csv() replaces
+    the contents of the database with the CSV files at any later time.
+
+    Amounts of money are stored as ints of 1/Money.SCALE dollars, and the database
+    records the scale as its user_version. Databases written at another scale, or by
+    earlier versions in float dollars, are converted when opened. Order timestamps are
+    stored as microseconds since the epoch; the local time text of earlier versions is
+    converted when opened as well.
+
+    Args:
+        customer_file_path (str): The CSV file customers are imported from
+        product_file_path (str): The CSV file products are imported from
+        orders_file_path (str, optional): The CSV file orders are imported from
+        database_file_path (str, optional): The SQLite database. Defaults to records.db
+            next to the customer file
+    """
+
+    def __init__(self, customer_file_path: str, product_file_path: str, orders_file_path: str = None,
+                 database_file_path: str = None) -> None:
+        super().__init__(customer_file_path, product_file_path, orders_file_path)
+        if database_file_path is None:
+            database_file_path = os.path.join(os.path.dirname(customer_file_path), 'records.db')
+        self.database_file_path = database_file_path
+        self._lock = threading.RLock()
+        self._depth = 0
+        is_new = not os.path.exists(database_file_path)
+        self._connection = sqlite3.connect(database_file_path, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+        if is_new:
+            self._connection.execute(f'PRAGMA user_version = {SCALE}')
+            self.import_csv()
+        self._convert_money()
+        self._convert_timestamps()
+
+    def _convert_money(self):
+        # A user_version of 0 is a database from before amounts were scaled, in dollars
+        scale = self._connection.execute('PRAGMA user_version').fetchone()[0] or 1
+        if scale == SCALE:
+            return
+        with self.transaction():
+            self._connection.execute('UPDATE customers SET value = CAST(ROUND(value * ? / ?) AS INTEGER)',
+                                     (float(SCALE), scale))
+            self._connection.execute('UPDATE products SET price = CAST(ROUND(price * ? / ?) AS INTEGER) '
+                                     'WHERE price IS NOT NULL', (float(SCALE), scale))
+            self._connection.execute(f'PRAGMA user_version = {SCALE}')
+
+    def _convert_timestamps(self):
+        column_type, = self._connection.execute(
+            "SELECT type FROM pragma_table_info('orders') WHERE name = 'timestamp'").fetchone()
+        if column_type.upper() == 'INTEGER':
+            return
+        # The column type can only be changed by copying the table
+        with self.transaction():
+            self._connection.execute('ALTER TABLE orders RENAME TO orders_text')
+            self._connection.execute('DROP INDEX IF EXISTS orders_customer')
+            self._connection.execute('DROP INDEX IF EXISTS orders_timestamp')
+            self._connection.execute(ORDERS_TABLE)
+            rows = self._connection.execute(
+                'SELECT customer_id, product_id, quantity, timestamp FROM orders_text ORDER BY rowid')
+            self._connection.executemany(
+                'INSERT INTO orders VALUES (?, ?, ?, ?)',
+                ((customer, product, quantity, parse_timestamp(str(timestamp)))
+                 for customer, product, quantity, timestamp in rows))
+            self._connection.execute('DROP TABLE orders_text')
+            for statement in ORDER_INDEXES:
+                self._connection.execute(statement)
+
+    def import_csv(self):
+        """
+        Replaces the contents of the database with the customer, product and order
+        CSV files. Missing files leave their tables empty.
+        """
+        read_csv = lambda file_path: PersistentStorageManager.csv_reader(self, file_path) \
+            if file_path is not None and os.path.exists(file_path) else ()
+        with self.transaction():
+            for table in ('customers', 'products', 'bundle_products', 'orders'):
+                self._connection.execute(f'DELETE FROM {table}')
+            self._connection.executemany(
+                'INSERT INTO customers VALUES (?, ?, ?, ?)',
+                ((id, name, float(discount_rate), to_cents(value))
+                 for id, name, discount_rate, value in read_csv(self.customer_file_path)))
+            for args in read_csv(self.product_file_path):
+                id, name, stock = args[0], args[1], int(args[-1])
+                if id.startswith('P'):
+                    price = to_cents(args[2]) if args[2].strip() else None
+                    self._connection.execute('INSERT INTO products VALUES (?, ?, ?, ?)', (id, name, price, stock))
+                elif id.startswith('B'):
+                    self._connection.execute('INSERT INTO products VALUES (?, ?, NULL, ?)', (id, name, stock))
+                    self._connection.executemany(
+                        'INSERT INTO bundle_products VALUES (?, ?, ?)',
+                        ((id, position, product_id) for position, product_id in enumerate(args[2:-1])))
+            self._connection.executemany(
+                'INSERT INTO orders VALUES (?, ?, ?, ?)',
+                ((customer, product, int(quantity), parse_timestamp(timestamp))
+                 for customer, product, quantity, timestamp in read_csv(self.orders_file_path)))
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute('BEGIN IMMEDIATE')
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute('ROLLBACK')
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._connection.execute('COMMIT')
+
+    def csv_reader(self, file_path):
+        with self._lock:
+            if file_path == self.customer_file_path:
+                rows = self._connection.execute(
+                    'SELECT id, name, discount_rate, value FROM customers ORDER BY rowid').fetchall()
+                return [[id, name, str(discount_rate), format_money(int(value))]
+                        for id, name, discount_rate, value in rows]
+
+            bundles = {}
+            for bundle_id, product_id in self._connection.execute(
+                    'SELECT bundle_id, product_id FROM bundle_products ORDER BY bundle_id, position'):
+                bundles.setdefault(bundle_id, []).append(product_id)
+            rows = self._connection.execute('SELECT id, name, price, stock FROM products ORDER BY rowid').fetchall()
+        return [[id, name, '' if price is None else format_money(int(price)), str(stock)] if id.startswith('P')
+                else [id, name, *bundles.get(id, ()), str(stock)]
+                for id, name, price, stock in rows]
+
+    def source_paths(self):
+        return [self.database_file_path, self.database_file_path + '-wal']
+
+    def read_orders(self):
+        return SQLiteOrderHistory(self)
+
+    def _order_from_row(self, row):
+        customer, product, quantity, timestamp = row
+        return Order(sys.intern(customer), sys.intern(product), str(quantity), timestamp=timestamp)
+
+    def save_customer(self, customer: Customer):
+        id, name, discount_rate, value = customer
+        with self.transaction():
+            self._connection.execute('INSERT INTO customers VALUES (?, ?, ?, ?)', (id, name, discount_rate, value))
+
+    def update_customers_info(self, customers):
+        rows = [(name, discount_rate, value, id) for id, name, discount_rate, value in customers]
+        with self.transaction():
+            self._connection.executemany('UPDATE customers SET name = ?, discount_rate = ?, value = ? WHERE id = ?', rows)
+
+    def update_products_info(self, products):
+        rows = [(product.name, product.price if product.id.startswith('P') else None, product.stock, product.id)
+                for product in products]
+        with self.transaction():
+            self._connection.executemany('UPDATE products SET name = ?, price = ?, stock = ? WHERE id = ?', rows)
+
+    def save_orders(self, orders):
+        rows = [(order.customer.id, order.product.id, int(order.quantity), order.timestamp)
+                for order in orders]
+        with self.transaction():
+            self._connection.executemany('INSERT INTO orders VALUES (?, ?, ?, ?)', rows)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class SQLiteOrderHistory():
+    """
+    The orders table as a read-only sequence, in the order the orders were placed.
+    Orders are saved by the storage manager, so appending to the history does nothing;
+    the new rows are already part of it.
+
+    Args:
+        storage_manager (SQLiteStorageManager): The storage manager owning the database
+        chunk_size (int, optional): The number of rows fetched at a time while iterating
+    """
+
+    def __init__(self, storage_manager: SQLiteStorageManager, chunk_size: int = 10_000) -> None:
+        self._storage_manager = storage_manager
+        self._chunk_size = chunk_size
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM orders')[0][0]
+
+    def __iter__(self):
+        last_rowid = 0
+        while True:
+            rows = self._query('SELECT rowid, customer_id, product_id, quantity, timestamp FROM orders '
+                               'WHERE rowid > ? ORDER BY rowid LIMIT ?', (last_rowid, self._chunk_size))
+            for row in rows:
+                yield self._storage_manager._order_from_row(row[1:])
+            if len(rows) < self._chunk_size:
+                return
+            last_rowid = rows[-1][0]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        rows = self._query('SELECT customer_id, product_id, quantity, timestamp FROM orders '
+                           'ORDER BY rowid LIMIT 1 OFFSET ?', (index,)) if index >= 0 else []
+        if not rows:
+            raise IndexError('order index out of range')
+        return self._storage_manager._order_from_row(rows[0])
+
+    def append(self, order):
+        pass
+
+    def extend(self, orders):
+        pass
+
+    def orders_of_customer(self, customer_id: str):
+        rows = self._query('SELECT customer_id, product_id, quantity, timestamp FROM orders '
+                           'WHERE customer_id = ? ORDER BY timestamp, rowid', (customer_id,))
+        return [self._storage_manager._order_from_row(row) for row in rows]
+
+    def orders_between(self, start: int, end: int):
+        rows = self._query('SELECT customer_id, product_id, quantity, timestamp FROM orders '
+                           'WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp, rowid', (start, end))
+        return [self._storage_manager._order_from_row(row) for row in rows]
+
+    def _query(self, sql: str, parameters=()):
+        with self._storage_manager._lock:
+            return self._storage_manager._connection.execute(sql, parameters).fetchall()
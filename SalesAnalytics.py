@@ -0,0 +1,191 @@
+import heapq
+import threading
+from Money import apply_discounts
+from OrderClock import day_of
+from VIPMember import VIPMember
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CUSTOMER_TYPES = 'CMV'
+
+
+def _sum_by(index, values, size):
+    # bincount only totals float weights, which are not exact past 2**53
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, index, values)
+    return totals
+
+
+class SalesAnalytics():
+    """
+    Running sales totals, kept up to date as orders are placed so that reports read
+    them directly instead of scanning the order history: units sold and revenue per
+    product and bundle, revenue per customer type and orders, units and revenue per day.
+
+    Revenue is what customers paid for the products after their discount, without
+    membership fees. Orders placed before the analytics existed are added once with
+    backfill(), which prices them at the current product prices and discount rates,
+    as the history does not keep the price paid. Revenue is in 1/Money.SCALE dollars,
+    so totals are exact however many orders they add up.
+
+    Attributes:
+        units (dict of str: int): Units sold per product or bundle id
+        revenue (dict of str: int): Revenue per product or bundle id
+        revenue_by_type (dict of str: int): Revenue per customer type, C, M or V
+        daily (dict of str: list): Per day, as YYYY-MM-DD, the number of orders, the
+            units sold and the revenue
+        orders (int): The number of orders counted
+    """
+
+    def __init__(self) -> None:
+        self.units = {}
+        self.revenue = {}
+        self.revenue_by_type = dict.fromkeys(CUSTOMER_TYPES, 0)
+        self.daily = {}
+        self.orders = 0
+        self._lock = threading.Lock()
+
+    def record(self, order):
+        """Counts a placed order, whose customer and product are records."""
+        customer, product, quantity = order.customer, order.product, int(order.quantity)
+        revenue = customer.get_discount(product.price * quantity)[1]
+        with self._lock:
+            self._add(product.id, customer.id[0], day_of(order.timestamp), quantity, revenue)
+
+    def record_all(self, orders):
+        for order in orders:
+            self.record(order)
+
+    def _add(self, product_id: str, customer_type: str, day: str, quantity: int, revenue: int, orders: int = 1):
+        self.units[product_id] = self.units.get(product_id, 0) + quantity
+        self.revenue[product_id] = self.revenue.get(product_id, 0) + revenue
+        self.revenue_by_type[customer_type] += revenue
+        totals = self.daily.get(day)
+        if totals is None:
+            totals = self.daily[day] = [0, 0, 0]
+        totals[0] += orders
+        totals[1] += quantity
+        totals[2] += revenue
+        self.orders += orders
+
+    def product_totals(self, product_id: str):
+        """
+        Returns:
+            tuple of (int, int): The units sold and revenue of a product or bundle
+        """
+        return self.units.get(product_id, 0), self.revenue.get(product_id, 0)
+
+    def day_totals(self, day: str):
+        """
+        Returns:
+            tuple of (int, int, int): The orders, units sold and revenue of a day
+        """
+        return tuple(self.daily.get(day, (0, 0, 0)))
+
+    def total_revenue(self):
+        return sum(self.revenue_by_type.values())
+
+    def top_products(self, n: int = 10):
+        """The n product or bundle ids with the most revenue, with their revenue."""
+        return heapq.nlargest(n, self.revenue.items(), key=lambda item: item[1])
+
+    def backfill(self, orders, find_customer, find_product, chunk_size: int = 1 << 16):
+        """
+        Adds orders from the history, pricing them at the current prices and discount
+        rates. Orders whose customer or product no longer exists are skipped. With
+        numpy the orders are totalled a chunk at a time with vectorised group-bys.
+
+        Args:
+            orders (iterable of Order): The orders, whose customer and product may be
+                records or ids
+            find_customer (callable): Finds a customer by id
+            find_product (callable): Finds a product by id
+            chunk_size (int, optional): The number of orders totalled at a time
+        Returns:
+            int: The number of orders added
+        """
+        customers = {}
+        products = {}
+
+        def lookup(records, find, record):
+            if not isinstance(record, str):
+                return record
+            found = records.get(record)
+            if found is None and record not in records:
+                found = records[record] = find(record)
+            return found
+
+        rows = []
+        added = 0
+        for customer, product, quantity, _, timestamp in orders:
+            customer = lookup(customers, find_customer, customer)
+            product = lookup(products, find_product, product)
+            if customer is None or product is None or product.price is None:
+                continue
+            rows.append((customer, product, int(quantity), day_of(timestamp)))
+            if len(rows) >= chunk_size:
+                added += self._backfill_chunk(rows)
+                rows = []
+        if rows:
+            added += self._backfill_chunk(rows)
+        return added
+
+    def _backfill_chunk(self, rows):
+        if np is None:
+            with self._lock:
+                for customer, product, quantity, day in rows:
+                    revenue = customer.get_discount(product.price * quantity)[1]
+                    self._add(product.id, customer.id[0], day, quantity, revenue)
+            return len(rows)
+
+        # Group keys are numbered in order of appearance, so that _sum_by() can total
+        # every group in one pass
+        product_codes, customer_codes, day_codes = {}, {}, {}
+        code = lambda codes, key: codes.setdefault(key, len(codes))
+        product_index = np.fromiter((code(product_codes, product.id) for _, product, _, _ in rows), np.intp, len(rows))
+        customer_index = np.fromiter((code(customer_codes, customer.id) for customer, _, _, _ in rows), np.intp,
+                                     len(rows))
+        day_index = np.fromiter((code(day_codes, day) for _, _, _, day in rows), np.intp, len(rows))
+        quantities = np.fromiter((quantity for _, _, quantity, _ in rows), np.int64, len(rows))
+
+        products = {product.id: product for _, product, _, _ in rows}
+        customers = {customer.id: customer for customer, _, _, _ in rows}
+        prices = np.array([products[id].price for id in product_codes], dtype=np.int64)
+        discount_rates = np.array([customers[id].discount_rate for id in customer_codes], dtype=np.float64)
+        type_codes = np.array([CUSTOMER_TYPES.index(id[0]) for id in customer_codes], dtype=np.intp)
+
+        # VIP members get an extra discount on orders above the threshold, which is
+        # what get_discount() does one order at a time
+        totals = quantities * prices[product_index]
+        order_types = type_codes[customer_index]
+        rates = discount_rates[customer_index]
+        vip = order_types == CUSTOMER_TYPES.index('V')
+        if vip.any():
+            rates = rates + np.where(vip & (totals > VIPMember._discount_threshold), 0.05, 0.)
+        revenues = apply_discounts(totals, rates)
+
+        units_by_product = _sum_by(product_index, quantities, len(product_codes))
+        revenue_by_product = _sum_by(product_index, revenues, len(product_codes))
+        revenue_by_type = _sum_by(order_types, revenues, len(CUSTOMER_TYPES))
+        orders_by_day = np.bincount(day_index, minlength=len(day_codes))
+        units_by_day = _sum_by(day_index, quantities, len(day_codes))
+        revenue_by_day = _sum_by(day_index, revenues, len(day_codes))
+
+        with self._lock:
+            for id, i in product_codes.items():
+                self.units[id] = self.units.get(id, 0) + int(units_by_product[i])
+                self.revenue[id] = self.revenue.get(id, 0) + int(revenue_by_product[i])
+            for i, customer_type in enumerate(CUSTOMER_TYPES):
+                self.revenue_by_type[customer_type] += int(revenue_by_type[i])
+            for day, i in day_codes.items():
+                totals = self.daily.get(day)
+                if totals is None:
+                    totals = self.daily[day] = [0, 0, 0]
+                totals[0] += int(orders_by_day[i])
+                totals[1] += int(units_by_day[i])
+                totals[2] += int(revenue_by_day[i])
+            self.orders += len(rows)
+        return len(rows)
@@ -0,0 +1,461 @@
+import heapq
+import multiprocessing
+import os
+import shutil
+import threading
+from Listing import Listing
+from NameIndex import NameIndex
+from Order import Order
+from OrderClock import EARLIEST
+from PersistentStorageManager import PersistentStorageManager
+from Records import NewCustomer, Records
+
+
+def shard_of(customer_id: str, shards: int):
+    """
+    The shard owning a customer, by hash of the number in its id. The C/M/V prefix is
+    left out, so the owner only depends on the customer number.
+    """
+    return hash(int(customer_id[1:])) % shards
+
+
+class ShardedRecords():
+    """
+    Records partitioned by customer over `shards` worker processes, so that placing
+    orders is spread over several cores.
+
+    At startup the customer file is split into one customer file per shard, under
+    `shard_directory`, and every worker process keeps a Records over its own shard.
+    This process acts as the coordinator: it owns the products, reserves the stock of
+    an order before routing it to the shard owning its customer, and gives the stock
+    back should the shard reject the order. A batch of orders is sent to all shards at
+    once, so the shards charge their customers and write their files in parallel.
+
+    New orders are written to an order file per shard. On close the shard files are
+    merged back into the customer and order files and the shard directory is removed.
+    Shard files left behind by a crash are merged on the next start.
+
+    Args:
+        customer_file_path (str): The file path to the customer storage file
+        product_file_path (str): The file path to the product storage file
+        orders_file_path (str, optional): The file path to the orders storage file
+        shards (int, optional): The number of worker processes. Defaults to the CPU count
+        storage_manager_class (type, optional): The storage manager used by the
+            coordinator and by every shard
+        shard_directory (str, optional): Where the shard files are kept. Defaults to
+            shards/ next to the customer file
+
+    Attributes:
+        products (list): The products and bundles, owned by the coordinator
+        orders: The orders placed before the shards were started
+    """
+
+    def __init__(self, customer_file_path: str, product_file_path: str, orders_file_path: str = None,
+                 shards: int = None, storage_manager_class: type = PersistentStorageManager,
+                 shard_directory: str = None) -> None:
+        if shard_directory is None:
+            shard_directory = os.path.join(os.path.dirname(customer_file_path), 'shards')
+        self.customer_file_path = customer_file_path
+        self.product_file_path = product_file_path
+        self.orders_file_path = orders_file_path
+        self.shards = shards or os.cpu_count() or 1
+        self.storage_manager_class = storage_manager_class
+        self.shard_directory = shard_directory
+        self._storage_manager = storage_manager_class(customer_file_path, product_file_path, orders_file_path)
+        self._lock = threading.RLock()
+        self._customer_ids = set()
+        self._customer_ids_by_name = {}
+        self._products_by_id = {}
+        self._products_by_name = {}
+        self._customer_name_index = None
+        self._product_name_index = None
+        self._connections = []
+        self._processes = []
+
+        try:
+            self._merge_shards()
+            if hasattr(self._storage_manager, 'compact'):
+                self._storage_manager.compact()
+            self.products = self._storage_manager.read_catalog()
+        except Exception as e:
+            raise IOError(e) from e
+        for product in self.products:
+            self._products_by_id.setdefault(product.id, product)
+            self._products_by_name.setdefault(product.name, []).append(product)
+        try:
+            self.orders = self._storage_manager.read_orders()
+        except Exception:
+            print('Cannot load the order file. Run as if there is no order previously.')
+            self.orders = []
+
+        self.next_customer_id = self._split_customers() + 1
+        self._start_shards()
+
+    def find_product(self, query: str, search_in_name: bool = False):
+        by_name, by_id = self._products_by_name, self._products_by_id
+        if search_in_name is None:
+            return self.find_product(query, True) or self.find_product(query, False)
+        if search_in_name:
+            matches = by_name.get(query)
+            return matches[0] if matches else None
+        return by_id.get(query)
+
+    def find_customer(self, query: str, search_in_name: bool = None):
+        """
+        Fetches a customer from the shard owning it. The customer returned is a copy,
+        so changes to it are not seen by the shard.
+        """
+        customer_id = self._customer_id(query, search_in_name)
+        if customer_id is None:
+            return None
+        return self._call(shard_of(customer_id, self.shards), 'find_customer', customer_id)
+
+    def search_customers(self, query: str, limit: int = 10):
+        """Suggests customers whose name starts with or resembles query, fetched from their shards."""
+        with self._lock:
+            if self._customer_name_index is None:
+                self._customer_name_index = NameIndex(self._customer_ids_by_name, key=lambda name: name)
+            names = self._customer_name_index.search(query, limit)
+            customer_ids = [customer_id for name in names for customer_id in self._customer_ids_by_name[name]]
+        return [self.find_customer(customer_id, False) for customer_id in customer_ids[:limit]]
+
+    def search_products(self, query: str, limit: int = 10):
+        with self._lock:
+            if self._product_name_index is None:
+                self._product_name_index = NameIndex(self.products)
+            return self._product_name_index.search(query, limit)
+
+    def _customer_id(self, query: str, search_in_name: bool = None):
+        if search_in_name is None:
+            return self._customer_id(query, True) or self._customer_id(query, False)
+        if search_in_name:
+            matches = self._customer_ids_by_name.get(query)
+            return matches[0] if matches else None
+        return query if query in self._customer_ids else None
+
+    @property
+    def customers(self):
+        with self._lock:
+            shards = self._call_all([(shard, 'customers', ()) for shard in range(self.shards)])
+        return sorted((customer for customers in shards for customer in customers), key=lambda c: int(c.id[1:]))
+
+    def list_customers(self, format_string='{0}, {1}, {2}, {3}', listing: Listing = None):
+        return Records.list_customers(self, format_string, listing)
+
+    def list_products(self, format_string='{0}, {1}, {2}, {3}', listing: Listing = None):
+        return Records.list_products(self, format_string, listing)
+
+    def list_orders(self, customer_id: str = None, listing: Listing = None, start=None, end=None):
+        if customer_id is None and start is None and end is None:
+            # self.orders only holds the coordinator's orders, so all orders are listed
+            # as an open range, which merges in the shards' orders
+            start = EARLIEST
+        return Records.list_orders(self, customer_id, listing, start, end)
+
+    def orders_of_customer(self, customer_id: str):
+        if hasattr(self.orders, 'orders_of_customer'):
+            orders = list(self.orders.orders_of_customer(customer_id))
+        else:
+            orders = [order for order in self.orders if getattr(order.customer, 'id', order.customer) == customer_id]
+        if customer_id in self._customer_ids:
+            orders += self._call(shard_of(customer_id, self.shards), 'orders_of_customer', customer_id)
+        return orders
+
+    def orders_between(self, start=None, end=None):
+        orders = [Records.orders_between(self, start, end)]
+        with self._lock:
+            orders += self._call_all([(shard, 'orders_between', (start, end)) for shard in range(self.shards)])
+        return list(heapq.merge(*orders, key=lambda order: order.timestamp))
+
+    def create_new_customer(self, name: str, member_type: str = 'C'):
+        with self._lock:
+            number = self.next_customer_id
+            customer_id = member_type + str(number)
+            customer = self._call(shard_of(customer_id, self.shards), 'create_new_customer', number, name, member_type)
+            self.next_customer_id += 1
+            self._add_customer(customer.id, customer.name)
+        return customer
+
+    def _add_customer(self, customer_id: str, name: str):
+        self._customer_ids.add(customer_id)
+        if self._customer_name_index is not None and name not in self._customer_ids_by_name:
+            self._customer_name_index.add(name)
+        self._customer_ids_by_name.setdefault(name, []).append(customer_id)
+
+    def execute_order(self, order: Order):
+        (placed, reason), = self.execute_orders([order])
+        if not placed:
+            raise ValueError(reason)
+
+    def execute_orders(self, orders):
+        """
+        Places orders on the shards owning their customers. The customer and product
+        of an order may be given as records or as ids. A NewCustomer is given the next
+        customer number here and signed up by the shard, after which their
+        NewCustomer.customer is the customer id.
+
+        Args:
+            orders (iterable of Order): The orders to place
+        Returns:
+            list of tuple of (bool, str|None): Per order, whether it was placed and
+                otherwise why not
+        """
+        orders = list(orders)
+        results = [None] * len(orders)
+        batches = {}
+        with self._lock:
+            for i, order in enumerate(orders):
+                customer = order.customer
+                if isinstance(customer, NewCustomer) and customer.customer is not None:
+                    customer = customer.customer
+                product = order.product
+                if isinstance(product, str):
+                    product = self._products_by_id.get(product)
+                if isinstance(customer, NewCustomer):
+                    if customer.number is None:
+                        customer.number = self.next_customer_id
+                        self.next_customer_id += 1
+                    customer_id = customer.member_type + str(customer.number)
+                else:
+                    customer_id = getattr(customer, 'id', customer)
+                    if customer_id not in self._customer_ids:
+                        results[i] = (False, f'Customer {customer_id!r} could not be found')
+                        continue
+                if product is None:
+                    results[i] = (False, f'Product {order.product!r} could not be found')
+                    continue
+                reserved = Order(customer_id, product, order.quantity, order.purchased_VIP, order.timestamp)
+                reason = Records._reject_reason(reserved)
+                if reason is not None:
+                    results[i] = (False, reason)
+                    continue
+                product.stock -= order.quantity
+                # The shard is sent a NewCustomer as it is, to be signed up there
+                row = (customer if isinstance(customer, NewCustomer) else customer_id, product.id, order.quantity,
+                       order.purchased_VIP, order.timestamp)
+                batches.setdefault(shard_of(customer_id, self.shards), []).append((i, product, row))
+
+            calls = [(shard, 'execute_orders', ([row for _, _, row in batch],)) for shard, batch in batches.items()]
+            error = None
+            try:
+                shard_results = self._call_all(calls, raise_errors=False)
+            except EOFError as e:
+                shard_results, error = [e] * len(calls), e
+
+            touched = {}
+            for (shard, batch), executed in zip(batches.items(), shard_results):
+                if isinstance(executed, Exception):
+                    error = error or executed
+                    executed = [(False, str(executed))] * len(batch)
+                for (i, product, row), (placed, reason) in zip(batch, executed):
+                    results[i] = (placed, reason)
+                    touched[product.id] = product
+                    if not placed:
+                        product.stock += row[2]
+                    elif isinstance(row[0], NewCustomer):
+                        self._sign_up(orders[i], row[0])
+            if touched:
+                self._storage_manager.update_products_info(touched.values())
+        if error is not None:
+            raise error
+        return results
+
+    def _sign_up(self, order: Order, sign_up: NewCustomer):
+        # The shard signed the customer up with the first of their orders it placed,
+        # the same as Records.execute_orders
+        customer_id = sign_up.member_type + str(sign_up.number)
+        order.purchased_VIP = sign_up.customer is None and sign_up.member_type == 'V'
+        if sign_up.customer is None:
+            sign_up.customer = customer_id
+            self._add_customer(customer_id, sign_up.name)
+        order.customer = customer_id
+
+    def update_product_info(self, product):
+        with self._lock:
+            self._storage_manager.update_product_info(product)
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.send((None, ()))
+            for process in self._processes:
+                process.join()
+            for connection in self._connections:
+                connection.close()
+            self._connections, self._processes = [], []
+            if hasattr(self.orders, 'close'):
+                self.orders.close()
+            self._merge_shards()
+            self._storage_manager.close()
+
+    def _call(self, shard: int, method: str, *args):
+        return self._call_all([(shard, method, args)])[0]
+
+    def _call_all(self, calls, raise_errors: bool = True):
+        # All requests are sent before any answer is awaited, so the shards work on
+        # them at the same time. Failures come back as exceptions in the results.
+        with self._lock:
+            for shard, method, args in calls:
+                self._connections[shard].send((method, args))
+            results = [self._connections[shard].recv() for shard, _, _ in calls]
+        if raise_errors:
+            for ok, result in results:
+                if not ok:
+                    raise result
+        return [result for _, result in results]
+
+    def _shard_paths(self, shard: int):
+        directory = os.path.join(self.shard_directory, str(shard))
+        customer_file_path = os.path.join(directory, os.path.basename(self.customer_file_path))
+        orders_file_path = None
+        if self.orders_file_path is not None:
+            orders_file_path = os.path.join(directory, os.path.basename(self.orders_file_path))
+        return directory, customer_file_path, orders_file_path
+
+    def _split_customers(self):
+        # The customer lines are copied as they are, so any padding left by the
+        # storage manager is kept.
+        files = []
+        for shard in range(self.shards):
+            directory, customer_file_path, orders_file_path = self._shard_paths(shard)
+            os.makedirs(directory, exist_ok=True)
+            files.append(open(customer_file_path, 'w', encoding='utf-8'))
+            if orders_file_path is not None:
+                open(orders_file_path, 'w', encoding='utf-8').close()
+        last_number = 0
+        try:
+            with open(self.customer_file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    args = line.split(', ', 2)
+                    if len(args) < 3:
+                        continue
+                    customer_id, name = args[0], args[1]
+                    files[shard_of(customer_id, self.shards)].write(line)
+                    self._customer_ids.add(customer_id)
+                    self._customer_ids_by_name.setdefault(name, []).append(customer_id)
+                    last_number = max(last_number, int(customer_id[1:]))
+        finally:
+            for f in files:
+                f.close()
+        return last_number
+
+    def _start_shards(self):
+        for shard in range(self.shards):
+            _, customer_file_path, orders_file_path = self._shard_paths(shard)
+            connection, shard_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_run_shard, daemon=True,
+                args=(shard_connection, self.storage_manager_class, customer_file_path,
+                      self.product_file_path, orders_file_path))
+            process.start()
+            shard_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        # Every shard reports once its records are loaded
+        for connection in self._connections:
+            ok, result = connection.recv()
+            if not ok:
+                self.close()
+                raise IOError(result)
+
+    def _merge_shards(self):
+        if not os.path.isdir(self.shard_directory):
+            return
+        shards = sorted(int(name) for name in os.listdir(self.shard_directory) if name.isdigit())
+        customers = {}
+        for shard in shards:
+            directory, customer_file_path, orders_file_path = self._shard_paths(shard)
+            if not os.path.exists(customer_file_path):
+                continue
+            storage_manager = self.storage_manager_class(customer_file_path, self.product_file_path, orders_file_path)
+            if hasattr(storage_manager, 'compact'):
+                storage_manager.compact()
+            storage_manager.close()
+            with open(customer_file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    customers[line.split(', ', 1)[0]] = line
+            if orders_file_path is not None and os.path.exists(orders_file_path):
+                with open(orders_file_path, 'r', encoding='utf-8') as f_shard:
+                    while True:
+                        lines = f_shard.readlines(1 << 20)
+                        if not lines:
+                            break
+                        self._storage_manager.save_order_lines(lines)
+                os.remove(orders_file_path)
+
+        if customers:
+            with open(self.customer_file_path, 'r', encoding='utf-8') as f:
+                with self._storage_manager._replacing(self.customer_file_path) as f_new:
+                    for line in f:
+                        f_new.write(customers.pop(line.split(', ', 1)[0], line))
+                    for line in sorted(customers.values(), key=lambda line: int(line.split(', ', 1)[0][1:])):
+                        f_new.write(line)
+        shutil.rmtree(self.shard_directory)
+
+
+class _Shard():
+    """
+    The part of ShardedRecords running in a worker process, owning the customers of
+    one shard. Stock has been reserved by the coordinator before orders reach it.
+    """
+
+    def __init__(self, records: Records) -> None:
+        self.records = records
+
+    def execute_orders(self, rows):
+        results = [None] * len(rows)
+        pending = []
+        for i, (customer_id, product_id, quantity, purchased_VIP, timestamp) in enumerate(rows):
+            if isinstance(customer_id, NewCustomer):
+                customer = customer_id
+            else:
+                customer = self.records.find_customer(customer_id, False)
+            if customer is None:
+                results[i] = (False, f'Customer {customer_id!r} could not be found')
+                continue
+            product = self.records.find_product(product_id)
+            pending.append((i, Order(customer, product, quantity, purchased_VIP, timestamp)))
+        executed = self.records.execute_orders([order for _, order in pending], stock_reserved=True)
+        for (i, _), result in zip(pending, executed):
+            results[i] = result
+        return results
+
+    def create_new_customer(self, number: int, name: str, member_type: str):
+        self.records.next_customer_id = number
+        return self.records.create_new_customer(name, member_type)
+
+    def find_customer(self, customer_id: str):
+        return self.records.find_customer(customer_id, False)
+
+    def customers(self):
+        return list(self.records.customers)
+
+    def orders_of_customer(self, customer_id: str):
+        return list(self.records.orders_of_customer(customer_id))
+
+    def orders_between(self, start, end):
+        return list(self.records.orders_between(start, end))
+
+
+def _run_shard(connection, storage_manager_class, customer_file_path, product_file_path, orders_file_path):
+    try:
+        storage_manager = storage_manager_class(customer_file_path, product_file_path, orders_file_path)
+        records = Records(customer_file_path, product_file_path, orders_file_path, storage_manager=storage_manager,
+                          snapshot=False)
+    except Exception as e:
+        connection.send((False, e))
+        return
+    connection.send((True, None))
+    shard = _Shard(records)
+    try:
+        while True:
+            method, args = connection.recv()
+            if method is None:
+                break
+            try:
+                connection.send((True, getattr(shard, method)(*args)))
+            except Exception as e:
+                connection.send((False, e))
+    finally:
+        records.close()
+        connection.close()
@@ -0,0 +1,101 @@
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+from Money import SCALE
+
+SNAPSHOT_VERSION = 2
+
+
+class SnapshotCache():
+    """
+    Keeps the customers and products parsed from the storage files in a pickle, so that
+    a later start can load them in one go instead of parsing every line again.
+
+    The snapshot is stored together with a fingerprint of the files it was made from:
+    the modification time and size of each file, and a hash of its first and last
+    `sample_size` bytes. The snapshot is only used while the fingerprint still matches,
+    so any change to the files, even one keeping their size, means a full parse.
+
+    Args:
+        file_path (str): The snapshot file
+        source_paths (list of str): The files the snapshot is made from
+        sample_size (int, optional): The number of bytes hashed at each end of a file
+
+    Attributes:
+        file_path (str): The snapshot file
+    """
+
+    def __init__(self, file_path: str, source_paths, sample_size: int = 1 << 16) -> None:
+        self.file_path = file_path
+        self.source_paths = list(source_paths)
+        self.sample_size = sample_size
+
+    def fingerprint(self):
+        fingerprint = []
+        for path in self.source_paths:
+            if path is None or not os.path.exists(path):
+                fingerprint.append((path, None))
+                continue
+            stat = os.stat(path)
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                digest.update(f.read(self.sample_size))
+                if stat.st_size > self.sample_size:
+                    f.seek(max(self.sample_size, stat.st_size - self.sample_size))
+                    digest.update(f.read())
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size, digest.hexdigest()))
+        # Amounts are pickled as ints of the current scale
+        return (SNAPSHOT_VERSION, SCALE, fingerprint)
+
+    def load(self, fingerprint=None):
+        """
+        Loads the snapshot if it was made from the files as they are now.
+
+        Args:
+            fingerprint (optional): The fingerprint of the files, if already taken
+        Returns:
+            The state given to save(), or None if there is no usable snapshot
+        """
+        if fingerprint is None:
+            fingerprint = self.fingerprint()
+        # Unpickling creates every record at once, which would otherwise trigger the
+        # cyclic garbage collector over and over for objects which all stay alive
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(self.file_path, 'rb') as f:
+                if pickle.load(f) != fingerprint:
+                    return None
+                return pickle.load(f)
+        except Exception:
+            # A missing, truncated or outdated snapshot is only a cache miss
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def save(self, state, fingerprint=None):
+        """
+        Saves the state parsed from the files. The fingerprint should be taken before
+        the files were read, so that changes made while reading invalidate the snapshot.
+        """
+        if fingerprint is None:
+            fingerprint = self.fingerprint()
+        directory = os.path.dirname(self.file_path) or '.'
+        try:
+            fd, temp_file_path = tempfile.mkstemp(prefix='snapshot_', suffix='_temp', dir=directory)
+        except OSError:
+            return
+        try:
+            with open(fd, 'wb') as f:
+                pickle.dump(fingerprint, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file_path, self.file_path)
+        except (OSError, pickle.PicklingError):
+            # Failing to write the cache must not fail the caller
+            os.remove(temp_file_path)
+        except BaseException:
+            os.remove(temp_file_path)
+            raise
@@ -1,10 +1,12 @@
 from Member import Member
+from Money import apply_discount, to_cents
 
 class VIPMember(Member):
-    _discount_threshold = 1000.
-    _membership_cost = 200.
+    __slots__ = ('_discount_rate',)
+    _discount_threshold = to_cents(1000)
+    _membership_cost = to_cents(200)
 
-    def __init__(self, id: str, name: str, value: float = 0, discount_rate: float = 0.1) -> None:
+    def __init__(self, id: str, name: str, value: int = 0, discount_rate: float = 0.1) -> None:
         super().__init__(id, name, value)
         self._discount_rate = discount_rate
 
@@ -21,10 +23,10 @@ class VIPMember(Member):
         discount_rate = self.discount_rate
         if price > self._discount_threshold:
             discount_rate += 0.05
-        return discount_rate,  price * (1-discount_rate)
+        return discount_rate, apply_discount(price, discount_rate)
 
     def display_info(self):
-        attr = vars(self)
+        attr = self._attributes()
         attr['discount_rate'] = self.discount_rate
         attr['discount_threshold'] = self._discount_threshold
         print(f'Customer: {attr}')
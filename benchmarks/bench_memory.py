@@ -0,0 +1,74 @@
+"""
+Measures the memory used per entity instance, comparing the slotted entity
+classes with equivalent dict-backed instances laid out the way the entities
+were before they used __slots__.
+
+Usage: python benchmarks/bench_memory.py [count]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Bundle import Bundle
+from Customer import Customer
+from Member import Member
+from Order import Order
+from Product import Product
+from VIPMember import VIPMember
+
+
+class DictEntity():
+    def __init__(self, **attributes) -> None:
+        self.__dict__.update(attributes)
+
+
+# Amounts are ints of cents and timestamps ints of microseconds, as the entities keep them
+CENTS = 100
+START = 1_704_067_200_000_000
+
+
+def legacy_entities(count):
+    yield 'Customer', lambda i: DictEntity(_id=f'C{i}', _name=f'name{i}', value=i * CENTS)
+    yield 'Member', lambda i: DictEntity(_id=f'M{i}', _name=f'name{i}', value=i * CENTS)
+    yield 'VIPMember', lambda i: DictEntity(_id=f'V{i}', _name=f'name{i}', value=i * CENTS, _discount_rate=0.1)
+    yield 'Product', lambda i: DictEntity(_id=f'P{i}', _name=f'name{i}', price=i * CENTS, stock=i)
+    yield 'Bundle', lambda i: DictEntity(_id=f'B{i}', _name=f'name{i}', stock=i, discount=0.2,
+                                         products=[{'id': f'P{i}', 'price': i * CENTS},
+                                                   {'id': f'P{i + 1}', 'price': i * CENTS}])
+    yield 'Order', lambda i: DictEntity(customer=f'C{i}', product=f'P{i}', quantity=i, purchased_VIP=False,
+                                        timestamp=START + i)
+
+
+def slotted_entities(count):
+    yield 'Customer', lambda i: Customer(f'C{i}', f'name{i}', i * CENTS)
+    yield 'Member', lambda i: Member(f'M{i}', f'name{i}', i * CENTS)
+    yield 'VIPMember', lambda i: VIPMember(f'V{i}', f'name{i}', i * CENTS, 0.1)
+    yield 'Product', lambda i: Product(f'P{i}', f'name{i}', i * CENTS, i)
+    components = [Product('P0', 'name0', CENTS, 1), Product('P1', 'name1', CENTS, 1)]
+    yield 'Bundle', lambda i: Bundle(f'B{i}', f'name{i}', components, i)
+    yield 'Order', lambda i: Order(f'C{i}', f'P{i}', i, timestamp=START + i)
+
+
+def measure(factory, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [factory(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del instances
+    return (after - before) / count
+
+
+def run(count=100_000):
+    print(f'{"entity":<10} {"dict B/obj":>11} {"slots B/obj":>12} {"saving":>8}')
+    for (name, legacy), (_, slotted) in zip(legacy_entities(count), slotted_entities(count)):
+        legacy_size = measure(legacy, count)
+        slotted_size = measure(slotted, count)
+        saving = 1 - slotted_size / legacy_size
+        print(f'{name:<10} {legacy_size:>11.1f} {slotted_size:>12.1f} {saving:>8.1%}')
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:2]))
@@ -0,0 +1,63 @@
+"""
+Compares the codecs closed order segments can be archived with: the size of the
+archived orders on disk against the time it takes to compress them and to scan every
+order back through the order log, as DisplayOrders and the analytics backfill do.
+
+Usage: python benchmarks/bench_order_codecs.py [orders] [repeat]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_dataset import generate
+from OrderHistory import CODECS
+from PersistentStorageManager import PersistentStorageManager
+
+
+def scan(order_log):
+    count = 0
+    for _ in order_log:
+        count += 1
+    return count
+
+
+def run(order_count=500_000, repeat=3):
+    with tempfile.TemporaryDirectory() as template:
+        customers, products, orders = generate(template, 10_000, 1_000, 100, order_count)
+        raw_bytes = os.path.getsize(orders)
+        print(f'{order_count} orders, {raw_bytes / 1e6:.1f} MB uncompressed')
+        print(f'{"codec":>8} {"MB":>8} {"ratio":>6} {"archive s":>10} {"scan s":>8} {"orders/s":>10} {"MB/s":>8}')
+
+        for codec in (None, *CODECS):
+            name = codec or 'none'
+            directory = os.path.join(template, name)
+            os.makedirs(os.path.join(directory, 'orders'))
+            # The order file is taken in by the log as its first, closed segment
+            shutil.copy(orders, os.path.join(directory, 'orders.csv'))
+            storage_manager = PersistentStorageManager(customers, products, os.path.join(directory, 'orders'))
+            order_log = storage_manager.order_log
+
+            start = time.perf_counter()
+            if codec is not None:
+                order_log.archive(codec)
+            archive_time = time.perf_counter() - start
+            disk_bytes = sum(segment['bytes'] for segment in order_log.segments)
+
+            scan_time = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                scanned = scan(order_log)
+                scan_time = min(scan_time, time.perf_counter() - start)
+            assert scanned == order_count
+            storage_manager.close()
+
+            print(f'{name:>8} {disk_bytes / 1e6:>8.1f} {raw_bytes / disk_bytes:>6.2f} {archive_time:>10.2f} '
+                  f'{scan_time:>8.2f} {order_count / scan_time:>10.0f} {raw_bytes / 1e6 / scan_time:>8.1f}')
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:3]))
@@ -0,0 +1,185 @@
+"""
+Benchmarks Records against a generated store and reports the results as JSON, so
+runs can be compared between releases. Covered are load time (parsing the files and
+from the snapshot cache), find_customer and find_product by id and by name,
+execute_order latency and list_customers rendering.
+
+Every run works on a copy of the data, so the store given with --data is not changed.
+
+Usage: python benchmarks/bench_records.py [--customers N] [--products N] [--bundles N]
+                                         [--orders N] [--data directory] [--storage csv]
+                                         [--repeat N] [--placed N] [--output file]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_dataset import generate
+from main import STORAGE_MANAGERS
+from Order import Order
+from Records import Records
+
+FILE_NAMES = ('customers.csv', 'products.csv', 'orders.csv')
+
+
+def summary(seconds):
+    return {'min': min(seconds), 'median': statistics.median(seconds), 'max': max(seconds), 'runs': len(seconds)}
+
+
+def per_operation(seconds, operations):
+    return {'ns_per_op': min(seconds) / operations * 1e9, 'operations': operations}
+
+
+def latencies(seconds):
+    ordered = sorted(seconds)
+    percentile = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    return {'mean_ms': statistics.fmean(ordered) * 1e3, 'p50_ms': percentile(0.5) * 1e3,
+            'p95_ms': percentile(0.95) * 1e3, 'max_ms': ordered[-1] * 1e3, 'orders': len(ordered)}
+
+
+def timed(function, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def open_records(paths, storage, **options):
+    return Records(*paths, storage_manager=STORAGE_MANAGERS[storage](*paths), **options)
+
+
+def bench_load(paths, storage, repeat):
+    def load(snapshot):
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            records = open_records(paths, storage, snapshot=snapshot)
+            seconds.append(time.perf_counter() - start)
+            records.close()
+        return summary(seconds)
+
+    results = {'parse': load(False)}
+    open_records(paths, storage).close()
+    results['snapshot'] = load(True)
+    return results
+
+
+def bench_lookups(records, rng, lookups, repeat):
+    customers = [rng.choice(records.customers) for _ in range(lookups)]
+    products = [rng.choice(records.products) for _ in range(lookups)]
+    customer_ids = [customer.id for customer in customers]
+    customer_names = [customer.name for customer in customers]
+    product_ids = [product.id for product in products]
+    product_names = [product.name for product in products]
+
+    def find_all(find, queries, search_in_name):
+        return lambda: [find(query, search_in_name) for query in queries]
+
+    return {
+        'find_customer_by_id': per_operation(timed(find_all(records.find_customer, customer_ids, False), repeat), lookups),
+        'find_customer_by_name': per_operation(timed(find_all(records.find_customer, customer_names, True), repeat), lookups),
+        'find_product_by_id': per_operation(timed(find_all(records.find_product, product_ids, False), repeat), lookups),
+        'find_product_by_name': per_operation(timed(find_all(records.find_product, product_names, True), repeat), lookups),
+    }
+
+
+def bench_execute_order(records, rng, placed):
+    in_stock = [product for product in records.products if product.stock > 0 and product.price]
+    seconds = []
+    for _ in range(placed):
+        product = rng.choice(in_stock)
+        order = Order(rng.choice(records.customers), product, 1)
+        if product.stock < 1:
+            continue
+        start = time.perf_counter()
+        records.execute_order(order)
+        seconds.append(time.perf_counter() - start)
+    return latencies(seconds) if seconds else None
+
+
+def bench_list_customers(records, repeat):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        seconds = timed(records.list_customers, repeat)
+    return dict(summary(seconds), customers=len(records.customers))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(options):
+    rng = random.Random(options.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        if options.data is None:
+            paths = generate(directory, options.customers, options.products, options.bundles, options.orders,
+                             options.seed)
+        else:
+            # A store without orders yet has no order file, which reads as no orders
+            paths = [os.path.join(directory, name) for name in FILE_NAMES]
+            for name in FILE_NAMES:
+                if os.path.exists(os.path.join(options.data, name)):
+                    shutil.copy(os.path.join(options.data, name), directory)
+
+        results = {'load': bench_load(paths, options.storage, options.repeat)}
+        records = open_records(paths, options.storage, snapshot=False)
+        results.update(bench_lookups(records, rng, options.lookups, options.repeat))
+        results['list_customers'] = bench_list_customers(records, options.repeat)
+        results['execute_order'] = bench_execute_order(records, rng, options.placed)
+        records.close()
+        sizes = {name: os.path.getsize(path) for name, path in zip(FILE_NAMES, paths)}
+
+    return {
+        'benchmark': 'records',
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'commit': git_commit(),
+        },
+        'parameters': dict(vars(options), file_sizes=sizes),
+        'results': results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark Records and its storage')
+    parser.add_argument('--customers', type=int, default=10_000)
+    parser.add_argument('--products', type=int, default=1_000)
+    parser.add_argument('--bundles', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data', help='benchmark a copy of this store instead of a generated one')
+    parser.add_argument('--storage', choices=STORAGE_MANAGERS, default='csv')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each timing, the best or median is reported')
+    parser.add_argument('--lookups', type=int, default=10_000, help='lookups per find_* timing')
+    parser.add_argument('--placed', type=int, default=100, help='orders placed for the execute_order latency')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    options = parse_args()
+    report = json.dumps(run(options), indent=2)
+    if options.output is None:
+        print(report)
+    else:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
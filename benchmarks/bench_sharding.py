@@ -0,0 +1,78 @@
+"""
+Measures order throughput of ShardedRecords for an increasing number of shards,
+against a single Records. Orders for random customers are placed in batches, and
+only the time spent placing them is counted, not starting or merging the shards.
+
+Usage: python benchmarks/bench_sharding.py [customers] [orders] [batch size] [max shards]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Order import Order
+from Records import Records
+from ShardedRecords import ShardedRecords
+
+PRODUCTS = 100
+
+
+def write_data(directory, customers):
+    paths = [os.path.join(directory, name) for name in ('customers.csv', 'products.csv', 'orders.csv')]
+    with open(paths[0], 'w', encoding='utf-8') as f:
+        for i in range(1, customers + 1):
+            f.write(f'{"CMV"[i % 3]}{i}, customer{i}, {0.1 if i % 3 == 2 else 0.0}, 0.0\n')
+    with open(paths[1], 'w', encoding='utf-8') as f:
+        for i in range(1, PRODUCTS + 1):
+            f.write(f'P{i}, product{i}, {i}.0, 1000000000\n')
+    open(paths[2], 'w').close()
+    return paths
+
+
+def place(records, orders, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(orders), batch_size):
+        records.execute_orders(orders[i:i + batch_size])
+    return time.perf_counter() - start
+
+
+def run(customers=100_000, order_count=20_000, batch_size=500, max_shards=None):
+    max_shards = max_shards or os.cpu_count() or 1
+    rng = random.Random(42)
+    planned = [(f'{"CMV"[c % 3]}{c}', f'P{rng.randint(1, PRODUCTS)}', rng.randint(1, 5))
+               for c in (rng.randint(1, customers) for _ in range(order_count))]
+
+    with tempfile.TemporaryDirectory() as template:
+        write_data(template, customers)
+
+        def fresh_copy(name):
+            directory = os.path.join(template, name)
+            os.mkdir(directory)
+            for file_name in ('customers.csv', 'products.csv', 'orders.csv'):
+                shutil.copy(os.path.join(template, file_name), directory)
+            return [os.path.join(directory, file_name) for file_name in ('customers.csv', 'products.csv', 'orders.csv')]
+
+        records = Records(*fresh_copy('single'))
+        orders = [Order(records.find_customer(c, False), records.find_product(p), q) for c, p, q in planned]
+        baseline = place(records, orders, batch_size)
+        records.close()
+        print(f'{customers} customers, {order_count} orders in batches of {batch_size}, {os.cpu_count()} CPUs')
+        print(f'{"shards":>8} {"orders/s":>10} {"speedup":>8}')
+        print(f'{"Records":>8} {order_count / baseline:>10.0f} {1.0:>8.2f}')
+
+        shards = 1
+        while shards <= max_shards:
+            records = ShardedRecords(*fresh_copy(f'shards{shards}'), shards=shards)
+            orders = [Order(c, p, q) for c, p, q in planned]
+            elapsed = place(records, orders, batch_size)
+            records.close()
+            print(f'{shards:>8} {order_count / elapsed:>10.0f} {baseline / elapsed:>8.2f}')
+            shards *= 2
+
+
+if __name__ == '__main__':
+    run(*map(int, sys.argv[1:5]))
@@ -0,0 +1,102 @@
+"""
+Writes a synthetic store in the CSV formats read by PersistentStorageManager:
+customers.csv, products.csv (products followed by bundles) and orders.csv. The
+output only depends on the sizes and the seed, so the same arguments always give
+byte-identical files. Rows are written as they are generated, so stores of 10^7
+rows do not have to fit in memory.
+
+Usage: python benchmarks/generate_dataset.py directory [--customers N] [--products N]
+                                             [--bundles N] [--orders N] [--seed N]
+"""
+import argparse
+import os
+import random
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ren', 'ta', 'vo', 'sel', 'an', 'dri', 'ko', 'ma', 'nu', 'pe', 'ri', 'sa', 'tor')
+PRODUCT_WORDS = ('apple', 'bread', 'cable', 'desk', 'eraser', 'fork', 'glass', 'hammer', 'ink', 'jacket',
+                 'kettle', 'lamp', 'mug', 'notebook', 'oven', 'pencil', 'quilt', 'radio', 'soap', 'towel')
+# 2024-01-01 00:00 UTC, in microseconds since the epoch as orders are stored
+ORDERS_START = 1_704_067_200_000_000
+
+
+def word(rng, syllables):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def customer_rows(rng, count):
+    for i in range(1, count + 1):
+        customer_type = rng.choices('CMV', weights=(6, 3, 1))[0]
+        discount_rate = {'C': 0.0, 'M': 0.05, 'V': round(rng.uniform(0.1, 0.2), 3)}[customer_type]
+        name = f'{word(rng, 2)} {word(rng, rng.randint(2, 3))}'
+        yield f'{customer_type}{i}, {name}, {discount_rate}, {round(rng.uniform(0, 5000), 2)}\n'
+
+
+def product_rows(rng, products, bundles):
+    for i in range(1, products + 1):
+        name = f'{rng.choice(PRODUCT_WORDS)} {word(rng, 2)} {i}'
+        yield f'P{i}, {name}, {round(rng.uniform(1, 500), 2)}, {rng.randint(0, 10_000)}\n'
+    # Bundles need products to be made of
+    for i in range(1, (bundles if products else 0) + 1):
+        components = ', '.join(f'P{rng.randint(1, products)}' for _ in range(rng.randint(2, 5)))
+        yield f'B{i}, {word(rng, 2)} bundle {i}, {components}, {rng.randint(0, 1_000)}\n'
+
+
+def order_rows(rng, orders, customer_types, products, bundles):
+    timestamp = ORDERS_START
+    for _ in range(orders):
+        timestamp += rng.randint(1, 60_000_000)
+        if bundles and rng.random() < 0.1:
+            product_id = f'B{rng.randint(1, bundles)}'
+        else:
+            product_id = f'P{rng.randint(1, products)}'
+        i = rng.randrange(len(customer_types))
+        customer_id = f'{chr(customer_types[i])}{i + 1}'
+        yield f'{customer_id}, {product_id}, {rng.randint(1, 10)}, {timestamp}\n'
+
+
+def write_rows(file_path, rows, buffer_size=1 << 20):
+    with open(file_path, 'w', encoding='utf-8', buffering=buffer_size) as f:
+        f.writelines(rows)
+
+
+def generate(directory, customers=1_000, products=100, bundles=10, orders=10_000, seed=0):
+    """
+    Writes customers.csv, products.csv and orders.csv into directory.
+
+    Returns:
+        list of str: The customer, product and order file paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, name) for name in ('customers.csv', 'products.csv', 'orders.csv')]
+    rng = random.Random(seed)
+    # Only the type letter of each customer is kept, one byte per customer, which is
+    # all the orders need to rebuild the customer ids
+    customer_types = bytearray()
+
+    def remember_types(rows):
+        for row in rows:
+            customer_types.append(ord(row[0]))
+            yield row
+
+    write_rows(paths[0], remember_types(customer_rows(rng, customers)))
+    write_rows(paths[1], product_rows(rng, products, bundles))
+    write_rows(paths[2], order_rows(rng, orders, customer_types, products, bundles) if customer_types and products else ())
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic Console-Mart store')
+    parser.add_argument('directory', help='where the CSV files are written')
+    parser.add_argument('--customers', type=int, default=1_000)
+    parser.add_argument('--products', type=int, default=100)
+    parser.add_argument('--bundles', type=int, default=10)
+    parser.add_argument('--orders', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    options = parse_args()
+    for path in generate(options.directory, options.customers, options.products, options.bundles,
+                         options.orders, options.seed):
+        print(f'{path}: {os.path.getsize(path)} bytes')
@@ -0,0 +1,117 @@
+"""
+Stress test for concurrent order placement. Places random orders from a thread pool
+through Records.execute_order and checks, in memory and after reloading the files,
+that no customer value, stock decrement or order line was lost. It also oversubscribes
+a product to check that stock is never sold twice.
+
+Usage: python benchmarks/stress_concurrent_orders.py [orders] [threads]
+"""
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from JournalStorageManager import JournalStorageManager
+from Money import to_cents
+from OffsetStorageManager import OffsetStorageManager
+from Order import Order
+from PersistentStorageManager import PersistentStorageManager
+from Records import Records
+from SQLiteStorageManager import SQLiteStorageManager
+
+CUSTOMERS = 50
+PRODUCTS = 20
+STOCK = 1_000_000
+
+
+def write_data(directory):
+    paths = [os.path.join(directory, name) for name in ('customers.csv', 'products.csv', 'orders.csv')]
+    with open(paths[0], 'w', encoding='utf-8') as f:
+        for i in range(1, CUSTOMERS + 1):
+            f.write(f'C{i}, customer{i}, 0.0, 0.0\n')
+    with open(paths[1], 'w', encoding='utf-8') as f:
+        for i in range(1, PRODUCTS + 1):
+            f.write(f'P{i}, product{i}, {i}.0, {STOCK}\n')
+        f.write(f'P{PRODUCTS + 1}, scarce, 1.0, 100\n')
+    return paths
+
+
+def check(condition, message, failures):
+    if not condition:
+        failures.append(message)
+
+
+def stress(storage_manager_class, order_count, threads):
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_data(directory)
+        records = Records(*paths, storage_manager=storage_manager_class(*paths))
+
+        rng = random.Random(42)
+        planned = [(f'C{rng.randint(1, CUSTOMERS)}', f'P{rng.randint(1, PRODUCTS)}', rng.randint(1, 5))
+                   for _ in range(order_count)]
+
+        def place(plan):
+            customer_id, product_id, quantity = plan
+            order = Order(records.find_customer(customer_id, False), records.find_product(product_id), quantity)
+            records.execute_order(order)
+
+        def place_scarce(customer_number):
+            order = Order(records.find_customer(f'C{customer_number % CUSTOMERS + 1}', False),
+                          records.find_product(f'P{PRODUCTS + 1}'), 1)
+            try:
+                records.execute_order(order)
+                return True
+            except ValueError:
+                return False
+
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(place, planned))
+            sold = sum(pool.map(place_scarce, range(400)))
+
+        expected_value = Counter()
+        expected_sold = Counter()
+        for customer_id, product_id, quantity in planned:
+            expected_value[customer_id] += to_cents(int(product_id[1:])) * quantity
+            expected_sold[product_id] += quantity
+        scarce_value = Counter(f'C{i % CUSTOMERS + 1}' for i in range(400))
+
+        check(sold == 100, f'{sold} of 100 scarce items sold', failures)
+        reloaded = Records(*paths, storage_manager=storage_manager_class(*paths))
+        for state, label in ((records, 'memory'), (reloaded, 'files')):
+            for customer in state.customers:
+                # Scarce orders succeed for an unpredictable subset of customers, so only
+                # the total across customers is checked for them.
+                expected = expected_value[customer.id]
+                check(expected <= customer.value <= expected + scarce_value[customer.id] * to_cents(1),
+                      f'{label}: {customer.id} value {customer.value}, expected {expected}', failures)
+            total = sum(customer.value for customer in state.customers)
+            check(total == sum(expected_value.values()) + to_cents(100), f'{label}: total value {total}', failures)
+            for product_id, quantity in expected_sold.items():
+                stock = state.find_product(product_id).stock
+                check(stock == STOCK - quantity, f'{label}: {product_id} stock {stock}, expected {STOCK - quantity}', failures)
+            check(state.find_product(f'P{PRODUCTS + 1}').stock == 0, f'{label}: scarce stock not 0', failures)
+            check(len(state.orders) == order_count + 100, f'{label}: {len(state.orders)} orders', failures)
+        records.close()
+        reloaded.close()
+    return failures
+
+
+def run(order_count=2000, threads=16):
+    failed = False
+    for storage_manager_class in (PersistentStorageManager, OffsetStorageManager, JournalStorageManager,
+                                  SQLiteStorageManager):
+        failures = stress(storage_manager_class, order_count, threads)
+        print(f'{storage_manager_class.__name__}: {"FAILED" if failures else "ok"}')
+        for failure in failures[:10]:
+            print(f'    {failure}')
+        failed = failed or bool(failures)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run(*map(int, sys.argv[1:3])))
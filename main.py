@@ -1,23 +1,272 @@
-
+import argparse
+import asyncio
+import os
 import sys
 from pages.Menu import Menu
+import OrderHistory
+import SnapshotCache
+from BatchOrderProcessor import BatchOrderProcessor
+from JournalStorageManager import JournalStorageManager
+from Listing import FORMATS, Listing
+from Money import format_money
+from OffsetStorageManager import OffsetStorageManager
+from OrderClock import parse_timestamp
+from OrderHistory import CODECS
+from OrderServer import OrderServer
+from PersistentStorageManager import PersistentStorageManager
+from Profiler import Profiler
 from Records import Records
+from ShardedRecords import ShardedRecords
+from SQLiteStorageManager import SQLiteStorageManager
 
-def run():
-    try: 
-        args = ['./data/customers.csv', './data/products.csv', './data/orders.csv']
-        
-        c_args = sys.argv[1:4]
-        arg_length = len(c_args)
-        if arg_length > 0:
-            args[:arg_length] = c_args
-        
-        records = Records(*args)
+STORAGE_MANAGERS = {
+    'csv': PersistentStorageManager,
+    'offset': OffsetStorageManager,
+    'journal': JournalStorageManager,
+    'sqlite': SQLiteStorageManager,
+}
+
+def parse_args(argv, command=None):
+    prog = 'main.py' if command is None else f'main.py {command}'
+    parser = argparse.ArgumentParser(prog=prog, description='Console-Mart')
+    if command == 'batch':
+        parser.add_argument('feeds', nargs='+', metavar='feed',
+                            help='CSV or JSON lines file of customer, product, quantity[, membership]')
+        parser.add_argument('--files', nargs='+', default=[], metavar='file',
+                            help='customers, products and orders files')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='number of orders executed at a time')
+    else:
+        if command == 'list':
+            parser.add_argument('view', choices=('customers', 'products', 'orders'), help='what to list')
+        parser.add_argument('files', nargs='*', help='customers, products and orders files')
+    if command == 'list':
+        parser.add_argument('--format', choices=FORMATS, default='text', help='how rows are written')
+        parser.add_argument('--output', metavar='file', help='write the listing to this file instead of stdout')
+        parser.add_argument('--offset', type=int, default=0, help='number of rows to skip')
+        parser.add_argument('--limit', type=int, help='most rows to list')
+        parser.add_argument('--sort', metavar='column', help='column to sort the rows on')
+        parser.add_argument('--descending', action='store_true', help='sort from high to low')
+        parser.add_argument('--type', dest='types', metavar='letters',
+                            help='only list rows whose id starts with one of these letters, e.g. MV or B')
+        parser.add_argument('--customer', metavar='id', help='only list the orders of this customer')
+        parser.add_argument('--since', metavar='time', help='only list orders placed at or after this ISO 8601 time')
+        parser.add_argument('--until', metavar='time', help='only list orders placed before this ISO 8601 time')
+    if command == 'serve':
+        parser.add_argument('--host', default='127.0.0.1', help='interface to listen on')
+        parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='most orders placed together by the writer')
+    if command == 'report':
+        parser.add_argument('--top', type=int, default=10, help='number of best selling products shown')
+        parser.add_argument('--days', type=int, default=7, help='number of most recent days shown')
+    if command == 'archive':
+        parser.add_argument('--codec', choices=CODECS, default='gzip', help='how the segments are compressed')
+        parser.add_argument('--before', metavar='time',
+                            help='only archive segments whose orders were all placed before this ISO 8601 time')
+    if command in ('batch', 'serve'):
+        parser.add_argument('--shards', type=int, default=0,
+                            help='spread customers over this many worker processes')
+    parser.add_argument('--storage', choices=STORAGE_MANAGERS, default='csv',
+                        help='how records are written back to the files')
+    if command != 'import':
+        parser.add_argument('--segment-orders', action='store_true',
+                            help='keep the orders in daily segments in a directory named after the order file, '
+                                 'moving the order file into it on first use')
+    parser.add_argument('--columnar', action='store_true',
+                        help='keep customer values in NumPy arrays (requires numpy)')
+    parser.add_argument('--order-index', action='store_true',
+                        help='save the per-customer order index next to the order file on exit')
+    parser.add_argument('--no-snapshot', dest='snapshot', action='store_false',
+                        help='always parse the files instead of loading the snapshot cached from them')
+    parser.add_argument('--profile', action='store_true',
+                        help='time every storage, records and page operation and report it on exit '
+                             '(also enabled by CONSOLE_MART_PROFILE=1)')
+    if command is None:
+        parser.add_argument('--profile-action', metavar='action',
+                            help='run this menu action, by number or title, under cProfile')
+        parser.add_argument('--profile-output', metavar='file', default='profile.pstats',
+                            help='where the cProfile stats of --profile-action are dumped')
+        parser.add_argument('--page-size', type=int, metavar='rows',
+                            help='show customers, products and orders this many rows at a time')
+    return parser.parse_args(argv)
+
+def data_files(options):
+    args = ['./data/customers.csv', './data/products.csv', './data/orders.csv']
+
+    c_args = options.files[:3]
+    arg_length = len(c_args)
+    if arg_length > 0:
+        args[:arg_length] = c_args
+    if hasattr(options, 'segment_orders'):
+        # Once the orders are segmented they stay so, whether or not --segment-orders is
+        # given. The sqlite storage keeps its orders in the database instead.
+        directory = os.path.splitext(args[2])[0]
+        if options.segment_orders or options.storage != 'sqlite' \
+                and os.path.exists(os.path.join(directory, 'manifest.json')):
+            options.segment_orders = True
+            args[2] = directory
+    return args
+
+def load_records(options):
+    try:
+        args = data_files(options)
+
+        if options.segment_orders:
+            if options.storage == 'sqlite':
+                print('The sqlite storage keeps its orders in the database and cannot segment them.')
+                return None
+            os.makedirs(args[2], exist_ok=True)
+        if getattr(options, 'shards', 0) > 0:
+            if options.storage == 'sqlite':
+                print('Shards keep their customers in CSV files and cannot be used with the sqlite storage.')
+                return None
+            records = ShardedRecords(*args, shards=options.shards, storage_manager_class=STORAGE_MANAGERS[options.storage])
+            return records if options.profiler is None else options.profiler.instrument(records)
+        storage_manager = STORAGE_MANAGERS[options.storage](*args)
+        profiler = options.profiler
+        if profiler is None:
+            return Records(*args, storage_manager=storage_manager, columnar=options.columnar,
+                           save_order_index=options.order_index, snapshot=options.snapshot)
+
+        profiler.instrument(storage_manager, private=True)
+        profiler.count_io(OrderHistory)
+        profiler.count_io(SnapshotCache)
+        with profiler.timing('Records.__init__'):
+            records = Records(*args, storage_manager=storage_manager, columnar=options.columnar,
+                              save_order_index=options.order_index, snapshot=options.snapshot)
+        return profiler.instrument(records)
+    except ImportError as e:
+        print(str(e))
     except IOError as e:
         print('Error retrieving data from customers/products. The following error was recorded: ' + str(e))
+    return None
+
+def run_menu(options):
+    records = load_records(options)
+    if records is None:
         return
-    menu = Menu(records)
+    menu = Menu(records, options.page_size)
+    if options.profiler is not None:
+        options.profiler.instrument_menu(menu)
     menu.run()
+    records.close()
+
+def run_batch(options):
+    records = load_records(options)
+    if records is None:
+        return
+    processor = BatchOrderProcessor(records, options.batch_size)
+    try:
+        for feed in options.feeds:
+            processor.process_file(feed)
+    finally:
+        records.close()
+    print(processor.report())
+
+def run_server(options):
+    records = load_records(options)
+    if records is None:
+        return
+    server = OrderServer(records, options.host, options.port, options.batch_size)
+    print(f'Serving Console-Mart on http://{options.host}:{options.port}')
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        records.close()
+
+def run_import(options):
+    args = data_files(options)
+    storage_manager = SQLiteStorageManager(*args)
+    storage_manager.import_csv()
+    customers = len(storage_manager.read_customers())
+    products = len(storage_manager.read_catalog())
+    orders = len(storage_manager.read_orders())
+    storage_manager.close()
+    print(f'Imported {customers} customers, {products} products and {orders} orders into {storage_manager.database_file_path}')
+
+def run_list(options):
+    records = load_records(options)
+    if records is None:
+        return
+    output = None if options.output is None else open(options.output, 'w', encoding='utf-8', newline='')
+    try:
+        listing = Listing(options.format, output, options.offset, options.limit, options.sort,
+                          options.descending, options.types)
+        if options.view == 'customers':
+            records.list_customers(listing=listing)
+        elif options.view == 'products':
+            records.list_products(listing=listing)
+        else:
+            records.list_orders(options.customer, listing, options.since, options.until)
+    except ValueError as e:
+        print(str(e))
+    finally:
+        if output is not None:
+            output.close()
+        records.close()
+
+def run_report(options):
+    records = load_records(options)
+    if records is None:
+        return
+    try:
+        analytics = records.sales_analytics()
+        print(f'SALES: {analytics.orders} orders, {format_money(analytics.total_revenue())} (AUD)')
+        print('\nREVENUE BY CUSTOMER TYPE:')
+        for customer_type, revenue in analytics.revenue_by_type.items():
+            print(f'{customer_type}, {format_money(revenue)}')
+        print('\nTOP PRODUCTS:')
+        for product_id, revenue in analytics.top_products(options.top):
+            print(f'{product_id}, {analytics.units[product_id]}, {format_money(revenue)}')
+        print('\nDAILY TOTALS:')
+        for day in sorted(analytics.daily)[-options.days:]:
+            orders, units, revenue = analytics.daily[day]
+            print(f'{day}, {orders}, {units}, {format_money(revenue)}')
+    finally:
+        records.close()
+
+def run_archive(options):
+    options.segment_orders = True
+    args = data_files(options)
+    if not os.path.isdir(args[2]):
+        print(f'There are no order segments in {args[2]}.')
+        return
+    storage_manager = PersistentStorageManager(*args)
+    try:
+        before = None if options.before is None else parse_timestamp(options.before)
+        archived = storage_manager.order_log.archive(options.codec, before)
+    except ValueError as e:
+        print(str(e))
+        return
+    finally:
+        storage_manager.close()
+    raw_bytes = sum(segment['raw_bytes'] for segment in archived)
+    archived_bytes = sum(segment['bytes'] for segment in archived)
+    print(f'Archived {len(archived)} segments with {options.codec}: {raw_bytes} bytes to {archived_bytes} bytes')
+
+COMMANDS = {
+    'batch': run_batch,
+    'serve': run_server,
+    'import': run_import,
+    'list': run_list,
+    'report': run_report,
+    'archive': run_archive,
+}
+
+def run():
+    argv = sys.argv[1:]
+    command = argv[0] if argv and argv[0] in COMMANDS else None
+    options = parse_args(argv[1:] if command else argv, command)
+    options.profiler = Profiler.from_options(options)
+    try:
+        COMMANDS.get(command, run_menu)(options)
+    finally:
+        if options.profiler is not None:
+            options.profiler.report()
+            options.profiler.restore()
 
 if __name__ == '__main__':
-    run()
\ No newline at end of file
+    run()
@@ -1,3 +1,4 @@
+from Listing import Listing
 
 
 class AbstractPage():
@@ -7,3 +8,18 @@ class AbstractPage():
 
     def run(self) -> int:
         pass
+
+    def show_pages(self, show, page_size: int = None):
+        """
+        Shows a listing page_size rows at a time, asking before each next page, or all
+        at once if there is no page size. show is given the Listing of the page and
+        returns the number of rows it showed.
+        """
+        offset = 0
+        while True:
+            shown = show(Listing(offset=offset, limit=page_size))
+            offset += shown
+            if page_size is None or shown < page_size:
+                return
+            if input('Press Enter for more, or q to stop: ').strip().lower() == 'q':
+                return
@@ -3,10 +3,11 @@ from pages.AbstractPage import AbstractPage
 
 
 class DisplayCustomers(AbstractPage):
-    def __init__(self, records: Records) -> None:
+    def __init__(self, records: Records, page_size: int = None) -> None:
         super().__init__()
         self.records = records
+        self.page_size = page_size
 
     def run(self) -> int:
-        self.records.list_customers()
+        self.show_pages(lambda listing: self.records.list_customers(listing=listing), self.page_size)
         return 0
\ No newline at end of file
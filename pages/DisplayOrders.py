@@ -3,13 +3,11 @@ from pages.AbstractPage import AbstractPage
 
 
 class DisplayOrders(AbstractPage):
-    def __init__(self, records: Records) -> None:
+    def __init__(self, records: Records, page_size: int = None) -> None:
         super().__init__()
         self.records = records
+        self.page_size = page_size
 
     def run(self) -> int:
-        print('ORDERS:')
-        for order in self.records.orders:
-            customer, product, quantity, _, timestamp = order
-            print(f'{customer}, {product}, {quantity}, {timestamp}', end='')
-        return 0
\ No newline at end of file
+        self.show_pages(lambda listing: self.records.list_orders(listing=listing), self.page_size)
+        return 0
@@ -3,9 +3,10 @@ from pages.AbstractPage import AbstractPage
 
 
 class DisplayOrdersCustomer(AbstractPage):
-    def __init__(self, records: Records) -> None:
+    def __init__(self, records: Records, page_size: int = None) -> None:
         super().__init__()
         self.records = records
+        self.page_size = page_size
 
     def run(self) -> int:
 
@@ -16,9 +17,5 @@ class DisplayOrdersCustomer(AbstractPage):
             print(f'Invalid customer!')
             return 0
 
-        print('ORDERS:')
-        for order in self.records.orders:
-            if order.customer == customer.id:
-                order_customer, product, quantity, _, timestamp = order
-                print(f'{order_customer}, {product}, {quantity}, {timestamp}', end='')
+        self.show_pages(lambda listing: self.records.list_orders(customer.id, listing), self.page_size)
         return 0
\ No newline at end of file
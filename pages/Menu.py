@@ -12,15 +12,15 @@ from pages.PlaceOrderPage import PlaceOrderPage
 
 
 class Menu(AbstractPage):
-    def __init__(self, records: Records) -> None:
+    def __init__(self, records: Records, page_size: int = None) -> None:
         super().__init__()
         self.records = records
         self.menu_items = [
             ('Place order', PlaceOrderPage(self.records)),
-            ('Display customers', DisplayCustomers(self.records)),
-            ('Display products', DisplayProducts(self.records)),
-            ('Display orders', DisplayOrders(self.records)),
-            ('Display customer orders', DisplayOrdersCustomer(self.records)),
+            ('Display customers', DisplayCustomers(self.records, page_size)),
+            ('Display products', DisplayProducts(self.records, page_size)),
+            ('Display orders', DisplayOrders(self.records, page_size)),
+            ('Display customer orders', DisplayOrdersCustomer(self.records, page_size)),
             ('Adjust VIP discount rate', AdjustVIPDiscount(self.records)),
             ('Adjust VIP discount threshold', AdjustVIPThreshold(self.records)),
             ('Exit', ExitPage()),
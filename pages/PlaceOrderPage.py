@@ -1,5 +1,6 @@
 
 from Customer import Customer
+from Money import format_money
 from Order import Order
 from Product import Product
 from Records import Records
@@ -8,9 +9,10 @@ from pages.AbstractPage import AbstractPage
 
 
 class PlaceOrderPage(AbstractPage):
-    def __init__(self, records: Records) -> None:
+    def __init__(self, records: Records, suggestions: int = 5) -> None:
         super().__init__()
         self.records = records
+        self.suggestions = suggestions
 
     def run(self):
         
@@ -30,10 +32,12 @@ class PlaceOrderPage(AbstractPage):
         else:
             order = Order(customer, product, quantity)
 
-        self.records.execute_order(order)
-        
-        if new_member_type == 'V':
-            customer.value += VIPMember.membership_cost
+        try:
+            self.records.execute_order(order)
+        except ValueError as e:
+            # Another order may have taken the stock since the quantity was checked
+            print(f'Your order could not be placed: {e}')
+            return 0
 
         self.print_order(order)
 
@@ -65,34 +69,49 @@ class PlaceOrderPage(AbstractPage):
 
     def ask_for_product(self):
         product_name = input('Please enter product name or ID: ')
-        product = self.records.find_product(product_name, search_in_name=True)
-
-        if product is None:
-            product = self.records.find_product(product_name)
+        product = self.find_product(product_name)
 
         if not (product is None or self.validate_product(product)):
             return None
 
         while product is None:
-            product_name = input('Product could not be found. Please enter a valid product name or ID: ')
-            
-            product = self.records.find_product(product_name, search_in_name=True)
-            if product is None:
-                product = self.records.find_product(product_name)
+            suggestions = self.records.search_products(product_name, self.suggestions)
+            if suggestions:
+                print('Product could not be found. Did you mean:')
+                for number, suggestion in enumerate(suggestions, 1):
+                    print(f'[{number}] {suggestion.id}, {suggestion.name}')
+                product_name = input('Please enter a suggestion number, or a valid product name or ID: ')
+            else:
+                product_name = input('Product could not be found. Please enter a valid product name or ID: ')
+
+            product = self.find_product(product_name)
+            if product is None and product_name.strip().isdigit() and 0 < int(product_name) <= len(suggestions):
+                product = suggestions[int(product_name) - 1]
 
             if not (product is None or self.validate_product(product)):
                 return None
         return product
 
+    def find_product(self, product_name: str):
+        product = self.records.find_product(product_name, search_in_name=True)
+        if product is None:
+            product = self.records.find_product(product_name)
+        return product
+
     def validate_product(self, product: Product):
-        if product.stock == 0:
-            print("Product is out of stock. Please choose another product.")
-            return False
-        if product.price is None or product.price <= 0:
-            print(f'Product has an invalid pricing of {product.price}. Returning to menu...')
+        reason = self.invalid_product_reason(product)
+        if reason is not None:
+            print(reason)
             return False
         return True
 
+    def invalid_product_reason(self, product: Product):
+        if product.stock == 0:
+            return "Product is out of stock. Please choose another product."
+        if product.price is None or product.price <= 0:
+            return f'Product has an invalid pricing of {format_money(product.price)}. Returning to menu...'
+        return None
+
     def ask_for_quantity(self, product: Product):
         quantity = input('Enter the amount you would like to purchase: ')
         
@@ -118,11 +137,11 @@ class PlaceOrderPage(AbstractPage):
         print(
             f'''
             {order.customer.name} purchase {order.quantity} x {order.product.name}
-            Unit Price:     {order.product.price} (AUD)
+            Unit Price:     {format_money(order.product.price)} (AUD)
             {order.customer.name} gets a discount of {discount_rate} %
             ''')
         
         if order.purchased_VIP:
-            print(f'\t    Membership price:   {VIPMember.membership_cost} (AUD)\n')
+            print(f'\t    Membership price:   {format_money(VIPMember.membership_cost)} (AUD)\n')
             total_cost += VIPMember.membership_cost
-        print(f'\t    Total price:    {total_cost} (AUD)')
+        print(f'\t    Total price:    {format_money(total_cost)} (AUD)')
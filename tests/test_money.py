@@ -0,0 +1,54 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Money import SCALE, apply_discount, apply_discounts, format_money, np, to_cents
+
+
+class TestMoney(unittest.TestCase):
+    def test_to_cents_reads_plain_amounts(self):
+        self.assertEqual(to_cents('2247.70'), 224770)
+        self.assertEqual(to_cents(' 5 '), 5 * SCALE)
+        self.assertEqual(to_cents('-0.05'), -5)
+        self.assertEqual(to_cents('.5'), 50)
+        self.assertEqual(to_cents(3), 300)
+
+    def test_to_cents_rounds_half_to_even(self):
+        self.assertEqual(to_cents('2.675'), 268)
+        self.assertEqual(to_cents('0.125'), 12)
+        self.assertEqual(to_cents('-0.125'), -12)
+        self.assertEqual(to_cents('1e-3'), 0)
+
+    def test_to_cents_reads_drifted_floats(self):
+        self.assertEqual(to_cents(0.1 + 0.2), 30)
+        self.assertEqual(to_cents(1.15 * 3), 345)
+
+    def test_to_cents_rejects_text(self):
+        with self.assertRaises(ValueError):
+            to_cents('ten dollars')
+
+    def test_format_money(self):
+        self.assertEqual(format_money(224770), '2247.70')
+        self.assertEqual(format_money(-5), '-0.05')
+        self.assertEqual(format_money(0), '0.00')
+        self.assertEqual(format_money(None), '')
+
+    def test_apply_discount_rounds_half_to_even(self):
+        self.assertEqual(apply_discount(1000, 0.15), 850)
+        self.assertEqual(apply_discount(5, 0.5), 2)
+        self.assertEqual(apply_discount(7, 0.5), 4)
+        # A rate only off by float error takes off the same amount
+        self.assertEqual(apply_discount(1000, 0.1 + 0.2), apply_discount(1000, 0.3))
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_apply_discounts_matches_apply_discount(self):
+        cents = [5, 7, 1000, 123457, 99]
+        rates = [0.5, 0.5, 0.15, 0.08, 0.125]
+        self.assertEqual(apply_discounts(np.array(cents), np.array(rates)).tolist(),
+                         [apply_discount(c, r) for c, r in zip(cents, rates)])
+
+
+if __name__ == '__main__':
+    unittest.main()
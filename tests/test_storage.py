@@ -0,0 +1,90 @@
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from JournalStorageManager import JournalStorageManager
+from Money import to_cents
+from OffsetStorageManager import OffsetStorageManager
+from Order import Order
+from PersistentStorageManager import PersistentStorageManager
+from Records import Records
+from SQLiteStorageManager import SQLiteStorageManager
+from stress_concurrent_orders import stress, write_data
+
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.paths = write_data(self._directory.name)
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def place(self, records, customer_id, product_id, quantity):
+        order = Order(records.find_customer(customer_id, False), records.find_product(product_id), quantity)
+        records.execute_order(order)
+
+    def test_concurrent_orders_are_atomic(self):
+        for storage_manager_class in (PersistentStorageManager, OffsetStorageManager, JournalStorageManager,
+                                      SQLiteStorageManager):
+            with self.subTest(storage=storage_manager_class.__name__):
+                self.assertEqual(stress(storage_manager_class, 300, 8), [])
+
+    def test_rejected_order_changes_nothing(self):
+        records = Records(*self.paths, storage_manager=PersistentStorageManager(*self.paths), snapshot=False)
+        with self.assertRaises(ValueError):
+            self.place(records, 'C1', 'P21', 101)
+        self.assertEqual(records.find_customer('C1', False).value, 0)
+        self.assertEqual(records.find_product('P21').stock, 100)
+        self.assertEqual(len(records.orders), 0)
+        records.close()
+
+    def test_journal_is_replayed_after_a_crash(self):
+        records = Records(*self.paths, storage_manager=JournalStorageManager(*self.paths), snapshot=False)
+        self.place(records, 'C1', 'P2', 3)
+        # The program stops without closing, so only the journal holds the changes
+        with open(self.paths[0], encoding='utf-8') as f:
+            self.assertIn('C1, customer1, 0.0, 0.0\n', f.read())
+        journal_file_path = records._storage_manager.journal_file_path
+        with open(journal_file_path, 'a', encoding='utf-8') as f:
+            f.write('{"file": "customers", "id": "C2", "li')
+
+        reloaded = Records(*self.paths, storage_manager=JournalStorageManager(*self.paths), snapshot=False)
+        self.assertEqual(reloaded.find_customer('C1', False).value, to_cents(6))
+        self.assertEqual(reloaded.find_customer('C2', False).value, 0)
+        self.assertEqual(reloaded.find_product('P2').stock, 999_997)
+        reloaded.close()
+
+    def test_offset_updates_in_place_until_a_record_outgrows_its_slot(self):
+        storage_manager = OffsetStorageManager(*self.paths)
+        records = Records(*self.paths, storage_manager=storage_manager, snapshot=False)
+        size = os.path.getsize(self.paths[0])
+        self.place(records, 'C1', 'P1', 1)
+        self.assertGreater(os.path.getsize(self.paths[0]), size)
+        # The rewrite gives the record slack, so it can grow again in place
+        size = os.path.getsize(self.paths[0])
+        self.place(records, 'C1', 'P1', 1)
+        self.assertEqual(os.path.getsize(self.paths[0]), size)
+
+        self.place(records, 'C2', 'P20', 50_000)
+        self.assertGreater(os.path.getsize(self.paths[0]), size)
+        size = os.path.getsize(self.paths[0])
+        self.place(records, 'C2', 'P1', 1)
+        self.assertEqual(os.path.getsize(self.paths[0]), size)
+        records.close()
+
+        reloaded = Records(*self.paths, storage_manager=PersistentStorageManager(*self.paths), snapshot=False)
+        self.assertEqual(reloaded.find_customer('C1', False).value, to_cents(2))
+        self.assertEqual(reloaded.find_customer('C2', False).value, to_cents(1_000_001))
+        self.assertEqual(reloaded.find_customer('C3', False).value, 0)
+        self.assertEqual(len(reloaded.customers), 50)
+        reloaded.close()
+
+
+if __name__ == '__main__':
+    unittest.main()